@@ -0,0 +1,115 @@
+import numpy as np
+
+MS_PER_YEAR = 365 * 24 * 3600 * 1000
+
+# turn a ChainSnapshot into nan padded (expiries, strikes) grids of strike and iv
+# one iv per strike, the call's mark_iv or the put's when the call has none, expired options are dropped
+# returns expiration timestamps (m,), years to expiry (m,), strikes (m, n), ivs (m, n)
+def snapshot_grid(snapshot, now_ms: int, field: str = 'mark_iv'):
+    ivs = getattr(snapshot, field)
+    keep = ~np.isnan(ivs) & (snapshot.expiration_timestamp > now_ms)
+    expiry = snapshot.expiration_timestamp[keep]
+    strike = snapshot.strike[keep]
+    iv = ivs[keep]
+
+    # the snapshot is sorted by expiry, strike, call first, so the first row of each pair is the one to keep
+    first = np.ones(len(strike), dtype=bool)
+    first[1:] = (expiry[1:] != expiry[:-1]) | (strike[1:] != strike[:-1])
+    expiry, strike, iv = expiry[first], strike[first], iv[first]
+
+    expiries, row_start, counts = np.unique(expiry, return_index=True, return_counts=True)
+    rows = np.repeat(np.arange(len(expiries)), counts)
+    columns = np.arange(len(strike)) - np.repeat(row_start, counts)
+    width = counts.max() if len(counts) else 0
+
+    strikes = np.full((len(expiries), width), np.nan)
+    grid = np.full((len(expiries), width), np.nan)
+    strikes[rows, columns] = strike
+    grid[rows, columns] = iv
+    times = (expiries - now_ms) / MS_PER_YEAR
+    return expiries, times, strikes, grid
+
+# forward of each of the given sorted expiries, the underlying_price its options report
+# and the index price for expiries whose options report none
+def expiry_forwards(snapshot, expiries: np.ndarray, index_price: float):
+    forwards = np.full(len(expiries), float(index_price))
+    if len(expiries) == 0:
+        return forwards
+    known = ~np.isnan(snapshot.underlying_price)
+    expiry = snapshot.expiration_timestamp[known]
+    underlying = snapshot.underlying_price[known]
+    rows = np.minimum(np.searchsorted(expiries, expiry), len(expiries) - 1)
+    match = expiries[rows] == expiry
+    forwards[rows[match]] = underlying[match]
+    return forwards
+
+# atm total variance per row, linear in strike between the strikes bracketing the forward
+# strikes and ivs are (m, n) nan padded, ivs in percent, forwards and times are (m,)
+# rows with the forward outside their strikes use the nearest strike, rows without any iv are nan,
+# an empty grid gives an empty result
+def atm_total_variance(strikes: np.ndarray, ivs: np.ndarray, forwards: np.ndarray, times: np.ndarray):
+    if strikes.shape[1] == 0:
+        return np.full(times.shape, np.nan)
+    forwards = np.broadcast_to(np.asarray(forwards, dtype=np.float64), times.shape)[:, None]
+    valid = ~np.isnan(strikes) & ~np.isnan(ivs)
+    variance = (ivs / 100) ** 2 * times[:, None]
+
+    below = valid & (strikes <= forwards)
+    above = valid & (strikes >= forwards)
+    lo = np.argmax(np.where(below, strikes, -np.inf), axis=1)
+    hi = np.argmin(np.where(above, strikes, np.inf), axis=1)
+    has_lo = below.any(axis=1)
+    has_hi = above.any(axis=1)
+    lo = np.where(has_lo, lo, hi)
+    hi = np.where(has_hi, hi, lo)
+
+    rows = np.arange(len(times))
+    k_lo, k_hi = strikes[rows, lo], strikes[rows, hi]
+    w_lo, w_hi = variance[rows, lo], variance[rows, hi]
+    span = k_hi - k_lo
+    weight = np.divide(forwards[:, 0] - k_lo, span, out=np.zeros_like(span), where=span > 0)
+    total_variance = w_lo + weight * (w_hi - w_lo)
+    return np.where(has_lo | has_hi, total_variance, np.nan)
+
+# atm iv in percent per row from atm_total_variance
+def interpolated_atm_iv(strikes: np.ndarray, ivs: np.ndarray, forwards: np.ndarray, times: np.ndarray):
+    total_variance = atm_total_variance(strikes, ivs, forwards, times)
+    return 100 * np.sqrt(total_variance / times)
+
+# constant maturity atm iv in percent, linear in total variance across expiries
+# times and total_variance are (m,) for one chain or (s, m) for s chains, sorted ascending and nan padded,
+# target_times is (t,), the result is (t,) or (s, t), targets outside the listed expiries use the nearest expiry's iv
+# and without any listed expiry they are nan
+def constant_maturity_iv(times: np.ndarray, total_variance: np.ndarray, target_times: np.ndarray):
+    single = times.ndim == 1
+    if times.shape[-1] == 0:
+        return np.full((len(target_times),) if single else (len(times), len(target_times)), np.nan)
+    times = np.atleast_2d(times)[:, :, None]
+    total_variance = np.atleast_2d(total_variance)[:, :, None]
+    targets = np.asarray(target_times, dtype=np.float64)[None, None, :]
+
+    valid = ~np.isnan(times) & ~np.isnan(total_variance)
+    below = valid & (times <= targets)
+    above = valid & (times >= targets)
+    lo = np.argmax(np.where(below, times, -np.inf), axis=1)
+    hi = np.argmin(np.where(above, times, np.inf), axis=1)
+    has_lo = below.any(axis=1)
+    has_hi = above.any(axis=1)
+    lo = np.where(has_lo, lo, hi)
+    hi = np.where(has_hi, hi, lo)
+
+    t_lo = np.take_along_axis(times[:, :, 0], lo, axis=1)
+    t_hi = np.take_along_axis(times[:, :, 0], hi, axis=1)
+    w_lo = np.take_along_axis(total_variance[:, :, 0], lo, axis=1)
+    w_hi = np.take_along_axis(total_variance[:, :, 0], hi, axis=1)
+    targets = targets[0]
+
+    span = t_hi - t_lo
+    weight = np.divide(targets - t_lo, span, out=np.zeros_like(span), where=span > 0)
+    interpolated = w_lo + weight * (w_hi - w_lo)
+    # outside the listed expiries hold the vol flat rather than the variance
+    extrapolated = np.where(targets < t_lo, w_lo / t_lo, w_hi / t_hi) * targets
+    total = np.where((targets < t_lo) | (targets > t_hi), extrapolated, interpolated)
+    iv = 100 * np.sqrt(total / targets)
+    iv = np.where(has_lo | has_hi, iv, np.nan)
+    return iv[0] if single else iv
@@ -0,0 +1,65 @@
+import argparse
+import time
+
+import numpy as np
+
+from iv_solver import black76, implied_vol
+
+# Deribit's minimum tick on inverse options, in units of the underlying
+TICK = 0.0001
+
+# throughput the solver is meant to reach, "thousands of options per millisecond"; a listed BTC chain
+# is around 1000 options, so the 1000 size is the one that matters for the live collectors
+TARGET_OPTIONS_PER_MS = 2000
+
+# synthetic chain shaped like a Deribit option chain, strikes around the forward and expiries from a day to a year
+# options whose time value is below one tick are not quoted on the exchange and are redrawn
+def make_chain(size: int, seed: int = 0):
+    rng = np.random.default_rng(seed)
+    forwards = np.full(size, 60000.0)
+    times = rng.choice(np.array([1, 2, 7, 14, 30, 60, 90, 180, 365]) / 365, size)
+    vols = rng.uniform(0.3, 1.2, size)
+    is_call = rng.random(size) < 0.5
+    strikes = np.empty(size)
+    redraw = np.ones(size, dtype=bool)
+    while redraw.any():
+        strikes[redraw] = np.round(forwards[redraw] * np.exp(rng.normal(0, 0.25, redraw.sum()) * np.sqrt(times[redraw] * 4)), -2)
+        prices, _ = black76(forwards, strikes, times, vols, is_call)
+        time_value = prices - np.maximum(np.where(is_call, forwards - strikes, strikes - forwards), 0)
+        redraw = time_value < TICK * forwards
+    return prices, forwards, strikes, times, is_call, vols
+
+def bench(size: int, repeats: int):
+    prices, forwards, strikes, times, is_call, vols = make_chain(size)
+    implied_vol(prices, forwards, strikes, times, is_call)
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        solved = implied_vol(prices, forwards, strikes, times, is_call)
+        timings.append(time.perf_counter() - start)
+    elapsed = float(np.median(timings))
+    error = np.nanmax(np.abs(solved - vols))
+    return elapsed, error, np.isnan(solved).sum()
+
+# usage: python bench_iv_solver.py [--sizes 1000 10000 100000] [--repeats 20]
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the vectorized Black-76 implied vol solver')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'options':>10} {'median ms':>10} {'options/ms':>11} {'max vol err':>12} {'unsolved':>9}")
+    missed = []
+    for size in args.sizes:
+        elapsed, error, unsolved = bench(size, args.repeats)
+        rate = size / elapsed / 1000
+        print(f"{size:>10} {elapsed * 1000:>10.3f} {rate:>11.0f} {error:>12.2e} {unsolved:>9}")
+        if rate < TARGET_OPTIONS_PER_MS:
+            missed.append(f"{size} options ({rate:.0f}/ms)")
+    if missed:
+        print(f"target of {TARGET_OPTIONS_PER_MS} options/ms NOT reached at {', '.join(missed)}")
+    else:
+        print(f"target of {TARGET_OPTIONS_PER_MS} options/ms reached at every size")
+
+if __name__ == "__main__":
+    main()
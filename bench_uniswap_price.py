@@ -0,0 +1,85 @@
+import argparse
+import decimal
+import random
+import time
+
+import numpy as np
+
+from uniswap_price import MAX_SQRT_RATIO, MAX_TICK, MIN_SQRT_RATIO, MIN_TICK, pool_price, pool_prices, sqrt_price_at_tick, ticks_to_prices
+
+# the WBTC/ETH pool of uniswap_collector.POOLS, the inverted 8/18 decimals case
+POOL = {'decimals0': 8, 'decimals1': 18, 'invert': True}
+
+# exact prices are only computed for this many values of every size, they are the slow path
+ERROR_SAMPLE = 10000
+
+# the float formula of get_uniswap_data.py and the old per pool scripts: square a float division of the uint160,
+# then undo the decimals with a hand tuned 1e10 and invert
+def convert_sqrt_price_x96(sqrt_price_x96: int):
+    price = (sqrt_price_x96 / (2 ** 96)) ** 2
+    return price
+
+def legacy_price_ratio(sqrt_price_x96: int):
+    return 1 / (convert_sqrt_price_x96(sqrt_price_x96) / 1e10)
+
+# sqrtPriceX96 values spread log uniformly over the whole range a pool can reach, with all their low bits set
+def make_sqrt_prices(size: int, seed: int = 0):
+    rng = random.Random(seed)
+    low, high = MIN_SQRT_RATIO.bit_length(), MAX_SQRT_RATIO.bit_length() - 1
+    return [rng.getrandbits(rng.randint(low, high)) | 1 << low for _ in range(size)]
+
+# 1.0001 ** tick to 40 digits, the reference of the vectorized tick path
+def tick_power(tick: int):
+    with decimal.localcontext() as context:
+        context.prec = 40
+        return decimal.Decimal('1.0001') ** tick
+
+def median_seconds(fn, repeats: int):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+# largest relative error of prices against the exact ones of the first ERROR_SAMPLE values
+def max_error(prices, sqrt_prices: list):
+    exact = np.array([float(pool_price(POOL, value)) for value in sqrt_prices[:ERROR_SAMPLE]])
+    return float(np.max(np.abs(np.asarray(prices[:ERROR_SAMPLE]) / exact - 1)))
+
+def bench(size: int, repeats: int):
+    sqrt_prices = make_sqrt_prices(size)
+    as_floats = np.array(sqrt_prices, dtype=object).astype(np.float64)
+    ticks = np.random.default_rng(0).integers(MIN_TICK, MAX_TICK + 1, size)
+    results = {
+        'legacy float': (median_seconds(lambda: [legacy_price_ratio(value) for value in sqrt_prices], repeats),
+                         max_error([legacy_price_ratio(value) for value in sqrt_prices[:ERROR_SAMPLE]], sqrt_prices)),
+        'exact fraction': (median_seconds(lambda: [float(pool_price(POOL, value)) for value in sqrt_prices], repeats), 0.0),
+        'vectorized ints': (median_seconds(lambda: pool_prices(POOL, sqrt_prices), repeats),
+                            max_error(pool_prices(POOL, sqrt_prices[:ERROR_SAMPLE]), sqrt_prices)),
+        'vectorized float64': (median_seconds(lambda: pool_prices(POOL, as_floats), repeats),
+                               max_error(pool_prices(POOL, as_floats[:ERROR_SAMPLE]), sqrt_prices)),
+    }
+    tick_sample = [int(tick) for tick in ticks[:ERROR_SAMPLE]]
+    exact_ticks = np.array([float(tick_power(-tick) * 10 ** 10) for tick in tick_sample])
+    tick_error = float(np.max(np.abs(ticks_to_prices(tick_sample, 8, 18, True) / exact_ticks - 1)))
+    results['vectorized ticks'] = (median_seconds(lambda: ticks_to_prices(ticks, 8, 18, True), repeats), tick_error)
+    return results
+
+# usage: python bench_uniswap_price.py [--sizes 10000 100000 1000000] [--repeats 5]
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the Uniswap price decoders against the float formula')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeats', type=int, default=5)
+    args = parser.parse_args()
+
+    # the tick path goes through TickMath, check it against the contract's own bounds first
+    assert sqrt_price_at_tick(MIN_TICK) == MIN_SQRT_RATIO and sqrt_price_at_tick(MAX_TICK) == MAX_SQRT_RATIO
+
+    print(f"{'values':>10} {'decoder':<20} {'median ms':>10} {'values/ms':>10} {'max rel err':>12}")
+    for size in args.sizes:
+        for name, (elapsed, error) in bench(size, args.repeats).items():
+            print(f"{size:>10} {name:<20} {elapsed * 1000:>10.3f} {size / elapsed / 1000:>10.0f} {error:>12.2e}")
+
+if __name__ == "__main__":
+    main()
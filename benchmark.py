@@ -0,0 +1,336 @@
+import argparse
+import asyncio
+import datetime
+import json
+import math
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+
+from web3 import AsyncWeb3, Web3
+
+import deribit_api
+from deribit_decode import decode_instruments
+from get_atm_iv import CURRENCIES, collect_tick, get_atm_option_iv, get_tomorrows_instruments
+from instrument_cache import InstrumentUniverse
+from rate_limiter import RequestScheduler
+from record_fixtures import POOLS
+from stand_in_servers import deribit_app, ethereum_app, serve_in_thread
+from storage import open_store
+from strike_index import StrikeIndex
+from uniswap_collector import POOLS as UNISWAP_POOLS, UniswapCollector
+from uniswap_swaps import SwapIngester
+
+SLOT0_ABI = [{
+    'inputs': [], 'name': 'slot0', 'stateMutability': 'view', 'type': 'function',
+    'outputs': [
+        {'internalType': 'uint160', 'name': 'sqrtPriceX96', 'type': 'uint160'},
+        {'internalType': 'int24', 'name': 'tick', 'type': 'int24'},
+        {'internalType': 'uint16', 'name': 'observationIndex', 'type': 'uint16'},
+        {'internalType': 'uint16', 'name': 'observationCardinality', 'type': 'uint16'},
+        {'internalType': 'uint16', 'name': 'observationCardinalityNext', 'type': 'uint16'},
+        {'internalType': 'uint8', 'name': 'feeProtocol', 'type': 'uint8'},
+        {'internalType': 'bool', 'name': 'unlocked', 'type': 'bool'}
+    ]
+}]
+
+# underlyings of the synthetic fixtures: index price, strike step, strikes per side, settlement currency
+SYNTHETIC_UNDERLYINGS = {
+    'BTC': (60000.0, 1000, 25, 'BTC'),
+    'ETH': (3400.0, 50, 25, 'ETH'),
+    'SOL': (150.0, 5, 15, 'USDC'),
+    'XRP': (0.6, 0.02, 10, 'USDC')
+}
+SYNTHETIC_EXPIRY_DAYS = (1, 2, 3, 7, 14, 21, 30, 60, 90, 180, 270, 365)
+
+# write a deterministic fixture set shaped like Deribit's responses, expiries are placed relative to today
+# so "tomorrow" always exists; use record_fixtures.py for real captured responses
+def write_synthetic_fixtures(directory: str, seed: int = 0):
+    rng = random.Random(seed)
+    today = datetime.datetime.now(datetime.timezone.utc).replace(hour=8, minute=0, second=0, microsecond=0)
+    listings = {'BTC': [], 'ETH': [], 'USDC': [], 'any': []}
+    summaries = {'BTC': [], 'ETH': [], 'USDC': [], 'any': []}
+    for base, (index_price, step, width, settlement) in SYNTHETIC_UNDERLYINGS.items():
+        prefix = base if settlement == base else f"{base}_{settlement}"
+        atm = round(index_price / step) * step
+        for days in SYNTHETIC_EXPIRY_DAYS:
+            expiry = today + datetime.timedelta(days=days)
+            code = f"{expiry.day}{expiry.strftime('%b%y').upper()}"
+            for i in range(-width, width + 1):
+                strike = round(atm + i * step, 8)
+                if strike <= 0:
+                    continue
+                strike_code = f"{strike:g}".replace('.', 'd')
+                for option_type in ('call', 'put'):
+                    name = f"{prefix}-{code}-{strike_code}-{option_type[0].upper()}"
+                    instrument = {
+                        'instrument_name': name, 'kind': 'option', 'option_type': option_type, 'strike': strike,
+                        'expiration_timestamp': int(expiry.timestamp() * 1000), 'base_currency': base,
+                        'quote_currency': settlement if settlement != base else base, 'settlement_currency': settlement,
+                        'counter_currency': 'USD' if settlement == base else settlement, 'is_active': True,
+                        'tick_size': 0.0001, 'min_trade_amount': 0.1, 'contract_size': 1.0,
+                        'creation_timestamp': int(expiry.timestamp() * 1000) - 30 * 86400000, 'settlement_period': 'day'
+                    }
+                    iv = 45 + abs(i) * 0.8 + rng.uniform(-1, 1)
+                    summary = {
+                        'instrument_name': name, 'base_currency': base, 'quote_currency': instrument['quote_currency'],
+                        'mark_iv': round(iv, 2), 'bid_price': 0.01, 'ask_price': 0.0105, 'mark_price': 0.0102,
+                        'mid_price': 0.01025, 'open_interest': round(rng.uniform(0, 500), 1), 'volume': 0.0,
+                        'underlying_price': index_price, 'underlying_index': f"SYN.{base}-{code}",
+                        'interest_rate': 0.0, 'estimated_delivery_price': index_price, 'creation_timestamp': 0
+                    }
+                    for listing in (settlement, 'any'):
+                        listings[listing].append(instrument)
+                        summaries[listing].append(summary)
+
+    def dump(endpoint: str, key: str, body: dict):
+        os.makedirs(os.path.join(directory, 'deribit', endpoint), exist_ok=True)
+        with open(os.path.join(directory, 'deribit', endpoint, f"{key}.json"), mode='w') as file:
+            json.dump(body, file)
+
+    for key in listings:
+        dump('get_instruments', key, {'jsonrpc': '2.0', 'result': listings[key], 'usIn': 0, 'usOut': 0, 'usDiff': 0, 'testnet': False})
+        dump('get_book_summary_by_currency', key, {'jsonrpc': '2.0', 'result': summaries[key], 'usIn': 0, 'usOut': 0, 'usDiff': 0, 'testnet': False})
+    for base, (index_price, _, _, _) in SYNTHETIC_UNDERLYINGS.items():
+        dump('get_index_price', f"{base.lower()}_usd", {'jsonrpc': '2.0', 'result': {'index_price': index_price, 'estimated_delivery_price': index_price}})
+    dump('get_order_book', 'default', {'jsonrpc': '2.0', 'result': {
+        'timestamp': 0, 'state': 'open', 'mark_iv': 52.37, 'mark_price': 0.0102, 'bid_iv': 51.9, 'ask_iv': 52.8,
+        'bids': [[0.01, 10.0]], 'asks': [[0.0105, 12.0]], 'best_bid_price': 0.01, 'best_ask_price': 0.0105,
+        'underlying_price': 60000.0, 'index_price': 60000.0, 'open_interest': 100.0, 'greeks': {}
+    }})
+
+    os.makedirs(os.path.join(directory, 'eth'), exist_ok=True)
+    for pool in POOLS:
+        sqrt_price_x96 = int(math.sqrt(rng.uniform(1e-4, 1e4)) * 2 ** 96)
+        words = [sqrt_price_x96, (-200000) % 2 ** 256, 1, 100, 100, 0, 1]
+        views = {'slot0': words, 'liquidity': [rng.randrange(2 ** 100)],
+                 'feeGrowthGlobal0X128': [rng.randrange(2 ** 200)], 'feeGrowthGlobal1X128': [rng.randrange(2 ** 200)]}
+        for view, view_words in views.items():
+            with open(os.path.join(directory, 'eth', f"{view}_{pool}.json"), mode='w') as file:
+                json.dump({'result': '0x' + ''.join(f"{word:064x}" for word in view_words)}, file)
+
+# median, p95 and rate of calling fn repeatedly
+def measure(fn, repeats: int):
+    fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+# same as measure for a coroutine function
+async def measure_async(fn, repeats: int):
+    await fn()
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        await fn()
+        timings.append(time.perf_counter() - start)
+    return summarize(timings)
+
+def summarize(timings: list):
+    timings.sort()
+    median = statistics.median(timings)
+    return {
+        'median_ms': round(median * 1000, 4),
+        'p95_ms': round(timings[int(len(timings) * 0.95) - 1 if len(timings) > 1 else 0] * 1000, 4),
+        'per_second': round(1 / median, 1) if median > 0 else None
+    }
+
+def bench_parsing(fixtures: str, repeats: int):
+    results = {}
+    with open(os.path.join(fixtures, 'deribit', 'get_instruments', 'BTC.json'), mode='rb') as file:
+        raw = file.read()
+    results['parse_instruments_json'] = measure(lambda: json.loads(raw), repeats)
+    results['parse_instruments'] = measure(lambda: decode_instruments(raw), repeats)
+    table = decode_instruments(raw)
+    results['build_strike_index'] = measure(lambda: StrikeIndex(table), repeats)
+    index = StrikeIndex(table)
+    price = 60400.0
+
+    def select():
+        chains = get_tomorrows_instruments(index, 'BTC')
+        return get_atm_option_iv(chains, price)
+    results['atm_select'] = measure(select, repeats * 10)
+    results['instruments'] = len(table)
+
+    # what one refresh of the SOL universe costs, scoped to the linear listing against every option on the exchange
+    for listing in ('USDC', 'any'):
+        path = os.path.join(fixtures, 'deribit', 'get_instruments', f"{listing}.json")
+        if not os.path.exists(path):
+            continue
+        with open(path, mode='rb') as file:
+            listing_raw = file.read()
+        results[f"load_universe_{listing}"] = measure(lambda: StrikeIndex(decode_instruments(listing_raw)), repeats)
+        results[f"universe_bytes_{listing}"] = len(listing_raw)
+    return results
+
+def bench_persistence(rows: int, repeats: int):
+    results = {}
+    directory = tempfile.mkdtemp()
+    start = datetime.datetime(2024, 7, 15)
+    timestamps = [start + datetime.timedelta(seconds=i) for i in range(rows)]
+    try:
+        backends = ['csv']
+        try:
+            import pyarrow
+            backends.append('parquet')
+        except ImportError:
+            pass
+        for backend in backends:
+            # every repeat writes to a new directory, a parquet store would otherwise compact the previous
+            # repeat's rows of the same day into its own and time a merge that grows every repeat
+            def persist():
+                repeat_directory = tempfile.mkdtemp(dir=directory)
+                series = {'bench': {'csv_file': os.path.join(repeat_directory, 'bench.csv'), 'column': 'ATM IV'}}
+                if backend == 'parquet':
+                    store = open_store(backend, series, root=repeat_directory)
+                else:
+                    store = open_store(backend, series, max_rows=60, max_delay=10)
+                for timestamp in timestamps:
+                    store.append('bench', timestamp, 52.37)
+                store.close()
+            result = measure(persist, repeats)
+            result['rows_per_second'] = round(rows / (result['median_ms'] / 1000))
+            results[f"persist_{backend}"] = result
+    finally:
+        shutil.rmtree(directory)
+    return results
+
+# ticks per second of collect_tick for every currency at once against the stand-in server
+async def bench_loop(base_url: str, ticks: int, source: str):
+    deribit_api.base_url = base_url + '/api/v2/public'
+    # the stand-in has no rate limit, don't let the client-side one pace the benchmark
+    deribit_api.rate_limiter = RequestScheduler(float('inf'), float('inf'))
+    async with deribit_api.create_session() as session:
+        universes = {}
+        for config in CURRENCIES.values():
+            if config['instrument_currency'] not in universes:
+                universes[config['instrument_currency']] = InstrumentUniverse(session, config['instrument_currency'])
+
+        async def run_currency(config: dict):
+            for _ in range(ticks):
+                await collect_tick(session, config, universes[config['instrument_currency']], source)
+
+        await asyncio.gather(*(run_currency(config) for config in CURRENCIES.values()))
+        start = time.perf_counter()
+        await asyncio.gather(*(run_currency(config) for config in CURRENCIES.values()))
+        elapsed = time.perf_counter() - start
+    return {'ticks': ticks * len(CURRENCIES), 'seconds': round(elapsed, 4), 'ticks_per_second': round(ticks * len(CURRENCIES) / elapsed, 1)}
+
+def bench_slot0(rpc_url: str, repeats: int):
+    w3 = Web3(Web3.HTTPProvider(rpc_url))
+    contract = w3.eth.contract(address=Web3.to_checksum_address(POOLS[0]), abi=SLOT0_ABI)
+    return measure(lambda: contract.functions.slot0().call(), repeats)
+
+# one tick of uniswap_collector.py over pool_count pools, the stand-in answers every pool with its recorded views
+async def bench_uniswap_poll(rpc_url: str, repeats: int, pool_count: int):
+    configs = list(UNISWAP_POOLS.values())
+    pools = {f"pool_{i}": configs[i % len(configs)] for i in range(pool_count)}
+    w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(rpc_url))
+    try:
+        return await measure_async(UniswapCollector(w3, pools, None).poll, repeats)
+    finally:
+        await w3.provider.disconnect()
+
+# swap backfill of blocks blocks for the configured pools, the stand-in makes up one swap per pool every 10 blocks
+async def bench_swap_backfill(rpc_url: str, blocks: int):
+    directory = tempfile.mkdtemp()
+    w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(rpc_url))
+    ingester = SwapIngester(w3, UNISWAP_POOLS, directory)
+    try:
+        start = time.perf_counter()
+        await ingester.backfill(20000000 - blocks, 20000000 - 1)
+        elapsed = time.perf_counter() - start
+    finally:
+        ingester.close()
+        await w3.provider.disconnect()
+        shutil.rmtree(directory)
+    return {
+        'blocks': blocks, 'swaps': ingester.swaps, 'requests': ingester.requests,
+        'seconds': round(elapsed, 3), 'swaps_per_second': round(ingester.swaps / elapsed, 1)
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+# print every numeric result next to the same one of an earlier report
+def compare(report: dict, baseline: dict):
+    print(f"{'benchmark':<40} {'baseline':>12} {'current':>12} {'change':>8}")
+    for group, results in report['results'].items():
+        for name, value in results.items():
+            values = value if isinstance(value, dict) else {'value': value}
+            for metric, current in values.items():
+                previous = baseline['results'].get(group, {}).get(name)
+                previous = previous.get(metric) if isinstance(previous, dict) else previous
+                if not isinstance(current, (int, float)) or not isinstance(previous, (int, float)) or not previous:
+                    continue
+                print(f"{f'{group}.{name}.{metric}':<40} {previous:>12} {current:>12} {current / previous - 1:>+8.1%}")
+
+# usage: python benchmark.py [--fixtures fixtures] [--output bench.json] [--compare old.json]
+# without a fixtures directory a synthetic set is generated in a temporary one
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark the collectors against recorded fixtures served locally')
+    parser.add_argument('--fixtures', default='fixtures')
+    parser.add_argument('--repeats', type=int, default=50)
+    parser.add_argument('--ticks', type=int, default=100)
+    parser.add_argument('--rows', type=int, default=10000)
+    parser.add_argument('--swap-blocks', type=int, default=100000, help='blocks of the swap backfill benchmark')
+    parser.add_argument('--output', default=None, help='write the report as json to this file')
+    parser.add_argument('--compare', default=None, help='earlier json report to compare against')
+    args = parser.parse_args()
+
+    fixtures = args.fixtures
+    synthetic = not os.path.isdir(os.path.join(fixtures, 'deribit'))
+    if synthetic:
+        fixtures = tempfile.mkdtemp()
+        write_synthetic_fixtures(fixtures)
+
+    try:
+        deribit_url = serve_in_thread(deribit_app(fixtures))
+        ethereum_url = serve_in_thread(ethereum_app(fixtures))
+        results = {
+            'parsing': bench_parsing(fixtures, args.repeats),
+            'persistence': bench_persistence(args.rows, max(3, args.repeats // 10)),
+            'loop': {
+                'order_book': asyncio.run(bench_loop(deribit_url, args.ticks, 'order_book')),
+                'book_summary': asyncio.run(bench_loop(deribit_url, args.ticks, 'book_summary'))
+            },
+            'uniswap': {
+                'slot0_call': bench_slot0(ethereum_url, args.repeats),
+                'poll_4_pools': asyncio.run(bench_uniswap_poll(ethereum_url, args.repeats, 4)),
+                'poll_200_pools': asyncio.run(bench_uniswap_poll(ethereum_url, max(3, args.repeats // 10), 200)),
+                'swap_backfill': asyncio.run(bench_swap_backfill(ethereum_url, args.swap_blocks))
+            }
+        }
+    finally:
+        if synthetic:
+            shutil.rmtree(fixtures)
+
+    report = {
+        'commit': git_commit(),
+        'created': datetime.datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'fixtures': 'synthetic' if synthetic else args.fixtures,
+        'results': results
+    }
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, mode='w') as file:
+            json.dump(report, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(report, json.load(file))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+import datetime
+import functools
+
+import numpy as np
+
+# Deribit options expire at 08:00 UTC on the date in the instrument name
+EXPIRY_HOUR_UTC = 8
+
+# strike, expiry timestamp in ms and option type from a name like BTC-26JUL24-60000-C or XRP_USDC-26JUL24-0d6-P
+# names only change with the listing while every tick's snapshot parses the whole chain, strptime is the
+# slow part so parsed names are cached, the cache holds a few complete listings of every currency
+@functools.lru_cache(maxsize=32768)
+def parse_option_name(instrument_name: str):
+    _, expiry, strike, option_type = instrument_name.split('-')
+    expiry_date = datetime.datetime.strptime(expiry, '%d%b%y').replace(hour=EXPIRY_HOUR_UTC, tzinfo=datetime.timezone.utc)
+    return float(strike.replace('d', '.')), int(expiry_date.timestamp() * 1000), option_type == 'C'
+
+# every option of a currency at one instant, parsed from get_book_summary_by_currency
+# each field is a numpy array with one entry per instrument, sorted by expiry then strike,
+# missing values (no bid, no iv) are nan
+class ChainSnapshot:
+    fields = ('mark_iv', 'bid_iv', 'ask_iv', 'mark_price', 'bid_price', 'ask_price', 'open_interest', 'underlying_price')
+
+    def __init__(self, summary: dict, base_currency: str = None, timestamp: int = None):
+        rows = [row for row in summary['result'] if base_currency is None or row['base_currency'] == base_currency]
+        parsed = [parse_option_name(row['instrument_name']) for row in rows]
+        order = sorted(range(len(rows)), key=lambda i: (parsed[i][1], parsed[i][0], not parsed[i][2]))
+
+        self.timestamp = timestamp if timestamp is not None else summary.get('usOut', 0) // 1000
+        self.instrument_names = [rows[i]['instrument_name'] for i in order]
+        self.positions = {name: i for i, name in enumerate(self.instrument_names)}
+        self.strike = np.array([parsed[i][0] for i in order], dtype=np.float64)
+        self.expiration_timestamp = np.array([parsed[i][1] for i in order], dtype=np.int64)
+        self.is_call = np.array([parsed[i][2] for i in order], dtype=bool)
+        rows = [rows[i] for i in order]
+        # numpy turns the None of a missing value into nan itself
+        for field in self.fields:
+            setattr(self, field, np.array([row.get(field) for row in rows], dtype=np.float64))
+
+    def __len__(self):
+        return len(self.instrument_names)
+
+    # value of one field for one instrument, None when the instrument is not in the snapshot
+    def get(self, instrument_name: str, field: str):
+        i = self.positions.get(instrument_name)
+        if i is None:
+            return None
+        value = getattr(self, field)[i]
+        return None if np.isnan(value) else float(value)
+
+    # boolean mask selecting the options of one expiry
+    def expiry_mask(self, expiration_timestamp: int):
+        return self.expiration_timestamp == expiration_timestamp
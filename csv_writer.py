@@ -0,0 +1,75 @@
+import atexit
+import csv
+import os
+import signal
+import time
+
+# every writer that is still open, flushed on exit and on SIGTERM
+_open_writers = set()
+
+# appends rows to a csv file in batches instead of opening the file for every row
+# rows are held in memory until max_rows are buffered or max_delay seconds have passed
+# since the oldest buffered row, durability is 'flush' (hand rows to the OS) or 'fsync' (wait for the disk)
+class BufferedCsvWriter:
+    def __init__(self, file_name: str, header: list = None, max_rows: int = 100, max_delay: float = 5.0, durability: str = 'flush'):
+        if durability not in ('flush', 'fsync'):
+            raise ValueError(f"durability must be 'flush' or 'fsync', got {durability!r}")
+        self.file_name = file_name
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.durability = durability
+        self.rows = []
+        self.oldest = None
+        self.file = open(file_name, mode='w' if header is not None else 'a', newline='')
+        self.writer = csv.writer(self.file)
+        if header is not None:
+            self.writer.writerow(header)
+            self.file.flush()
+        _open_writers.add(self)
+
+    def write_row(self, row: list):
+        if not self.rows:
+            self.oldest = time.monotonic()
+        self.rows.append(row)
+        if len(self.rows) >= self.max_rows or time.monotonic() - self.oldest >= self.max_delay:
+            self.flush()
+
+    # write out buffered rows if the oldest one has waited longer than max_delay
+    def flush_if_due(self):
+        if self.rows and time.monotonic() - self.oldest >= self.max_delay:
+            self.flush()
+
+    def flush(self):
+        if self.rows:
+            self.writer.writerows(self.rows)
+            self.rows = []
+            self.oldest = None
+        self.file.flush()
+        if self.durability == 'fsync':
+            os.fsync(self.file.fileno())
+
+    def close(self):
+        if self.file.closed:
+            return
+        self.flush()
+        self.file.close()
+        _open_writers.discard(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def close_all():
+    for writer in list(_open_writers):
+        writer.close()
+
+atexit.register(close_all)
+
+# turn SIGTERM into a normal exit so buffered rows are flushed by close_all
+# the handler only raises, so it never writes while a row is being buffered
+def install_signal_handlers():
+    def handle(signum, frame):
+        raise SystemExit(128 + signum)
+    signal.signal(signal.SIGTERM, handle)
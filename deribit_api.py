@@ -0,0 +1,96 @@
+import aiohttp
+import asyncio
+import logging
+
+from deribit_decode import loads
+from rate_limiter import RequestScheduler, backoff_delay
+
+base_url = 'https://deribit.com/api/v2/public'
+
+# transport settings shared by every Deribit REST call
+REQUEST_TIMEOUT = 5
+MAX_CONNECTIONS = 20
+KEEPALIVE_TIMEOUT = 60
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 2.0
+
+# statuses worth retrying, anything else is a permanent failure for this request
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+# one credit bucket for every Deribit request of the process
+rate_limiter = RequestScheduler()
+
+# set to a response_log.ResponseRecorder to keep every raw response for replay
+recorder = None
+
+# pooled keep-alive session, create one per process and pass it to the functions below
+def create_session():
+    connector = aiohttp.TCPConnector(limit=MAX_CONNECTIONS, keepalive_timeout=KEEPALIVE_TIMEOUT, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=REQUEST_TIMEOUT)
+    return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+# GET a public endpoint, retrying transient failures, returns the decoded response or None
+# decode turns the raw body into the result, by default it is plain json decoding
+async def get(session: aiohttp.ClientSession, endpoint: str, params: dict, decode=None):
+    url = base_url + endpoint
+    for attempt in range(MAX_RETRIES + 1):
+        await rate_limiter.acquire(endpoint)
+        try:
+            async with session.get(url, params=params) as response:
+                if response.status == 200:
+                    body = await response.read()
+                    if recorder is not None:
+                        recorder.record(endpoint, params, body)
+                    return decode(body) if decode is not None else loads(body)
+                text = await response.text()
+                if response.status not in RETRY_STATUSES:
+                    print(f"Failed to retrieve data: {response.status} {text}")
+                    logging.error(f"{endpoint} failed: {response.status} {text}")
+                    return None
+                if response.status == 429:
+                    rate_limiter.penalize()
+                logging.warning(f"{endpoint} returned {response.status}, attempt {attempt + 1}")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"{endpoint} request error: {e!r}, attempt {attempt + 1}")
+        if attempt < MAX_RETRIES:
+            await asyncio.sleep(backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP))
+    print(f"Failed to retrieve data: {endpoint} gave up after {MAX_RETRIES + 1} attempts")
+    logging.error(f"{endpoint} gave up after {MAX_RETRIES + 1} attempts")
+    return None
+
+# get current index_price of the asset
+async def get_index_price(session: aiohttp.ClientSession, index_name: str):
+    params = {
+        'index_name': index_name
+    }
+    response_data = await get(session, '/get_index_price', params)
+    if response_data is None:
+        return None
+    index_price = response_data['result']['index_price']
+    return index_price
+
+# get the order book of the specifized instrument
+async def get_order_book(session: aiohttp.ClientSession, instrument_name: str, depth: int):
+    params = {
+        'instrument_name': instrument_name,
+        'depth': depth
+    }
+    return await get(session, '/get_order_book', params)
+
+# get the list of instruments, decode=decode_instruments returns it as an InstrumentTable
+async def get_instruments(session: aiohttp.ClientSession, currency: str, kind: str, expired: str, decode=None):
+    params = {
+        'currency': currency,
+        'kind': kind,
+        'expired': expired
+    }
+    return await get(session, '/get_instruments', params, decode)
+
+# get the book summary (mark/bid/ask, iv, open interest, underlying) of every instrument of a currency
+async def get_book_summary_by_currency(session: aiohttp.ClientSession, currency: str, kind: str):
+    params = {
+        'currency': currency,
+        'kind': kind
+    }
+    return await get(session, '/get_book_summary_by_currency', params)
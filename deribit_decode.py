@@ -0,0 +1,73 @@
+import json
+from array import array
+
+# msgspec decodes straight into typed structs and skips every field it isn't asked for,
+# orjson is the fallback for everything else, both are optional
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# generic json decoding of a response body
+loads = orjson.loads if orjson is not None else json.loads
+
+# the fields of a get_instruments listing the collectors use, one column per field
+# strikes and expiries are packed arrays instead of thousands of dicts
+class InstrumentTable:
+    __slots__ = ('instrument_name', 'base_currency', 'expiration_timestamp', 'strike', 'is_call')
+
+    def __init__(self, instrument_name: list, base_currency: list, expiration_timestamp, strike, is_call):
+        self.instrument_name = instrument_name
+        self.base_currency = base_currency
+        self.expiration_timestamp = array('q', expiration_timestamp)
+        self.strike = array('d', strike)
+        self.is_call = array('b', is_call)
+
+    # build the table from an already decoded get_instruments response
+    @classmethod
+    def from_response(cls, data: dict):
+        instruments = data['result']
+        return cls(
+            [instrument['instrument_name'] for instrument in instruments],
+            [instrument['base_currency'] for instrument in instruments],
+            [instrument['expiration_timestamp'] for instrument in instruments],
+            [instrument['strike'] for instrument in instruments],
+            [instrument.get('option_type') == 'call' for instrument in instruments]
+        )
+
+    def __len__(self):
+        return len(self.instrument_name)
+
+    def rows(self):
+        return zip(self.instrument_name, self.base_currency, self.expiration_timestamp, self.strike, self.is_call)
+
+if msgspec is not None:
+    class InstrumentRow(msgspec.Struct):
+        instrument_name: str
+        base_currency: str
+        expiration_timestamp: int
+        strike: float = 0.0
+        option_type: str = ''
+
+    class InstrumentsResponse(msgspec.Struct):
+        result: list[InstrumentRow]
+
+    _instruments_decoder = msgspec.json.Decoder(InstrumentsResponse)
+
+# decode a raw get_instruments body into an InstrumentTable
+def decode_instruments(raw: bytes):
+    if msgspec is None:
+        return InstrumentTable.from_response(loads(raw))
+    instruments = _instruments_decoder.decode(raw).result
+    return InstrumentTable(
+        [instrument.instrument_name for instrument in instruments],
+        [instrument.base_currency for instrument in instruments],
+        [instrument.expiration_timestamp for instrument in instruments],
+        [instrument.strike for instrument in instruments],
+        [instrument.option_type == 'call' for instrument in instruments]
+    )
@@ -0,0 +1,64 @@
+import argparse
+import asyncio
+import json
+
+import websockets
+
+# local stand-in for the Deribit websocket that replays messages recorded by stream_atm_iv.py --record
+# subscribe and unsubscribe requests are acknowledged like Deribit does, and recorded
+# notifications are sent only for channels the client is currently subscribed to
+class ReplayServer:
+    def __init__(self, record_file: str, speed: float = 1.0):
+        self.speed = speed
+        self.notifications = []
+        with open(record_file) as file:
+            for line in file:
+                record = json.loads(line)
+                if record['message'].get('method') == 'subscription':
+                    self.notifications.append(record)
+
+    async def replay(self, websocket, subscribed: set):
+        previous = None
+        for record in self.notifications:
+            if previous is not None and self.speed > 0:
+                await asyncio.sleep(max(0.0, record['received'] - previous) / self.speed)
+            previous = record['received']
+            if record['message']['params']['channel'] in subscribed:
+                await websocket.send(json.dumps(record['message']))
+        await websocket.close()
+
+    async def handler(self, websocket, path: str = None):
+        subscribed = set()
+        replay = None
+        try:
+            async for raw in websocket:
+                request = json.loads(raw)
+                channels = request.get('params', {}).get('channels', [])
+                if request.get('method') == 'public/subscribe':
+                    subscribed.update(channels)
+                elif request.get('method') == 'public/unsubscribe':
+                    subscribed.difference_update(channels)
+                await websocket.send(json.dumps({'jsonrpc': '2.0', 'id': request.get('id'), 'result': channels}))
+                if replay is None:
+                    replay = asyncio.create_task(self.replay(websocket, subscribed))
+        finally:
+            if replay is not None:
+                replay.cancel()
+
+    async def serve(self, host: str, port: int):
+        async with websockets.serve(self.handler, host, port):
+            await asyncio.Future()
+
+# usage: python deribit_ws_replay.py recorded.jsonl --port 8765 --speed 10
+# then: python stream_atm_iv.py BTC --ws-url ws://localhost:8765
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded Deribit websocket messages')
+    parser.add_argument('record_file')
+    parser.add_argument('--host', default='localhost')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--speed', type=float, default=1.0, help='replay speed multiplier, 0 replays as fast as possible')
+    args = parser.parse_args()
+    asyncio.run(ReplayServer(args.record_file, args.speed).serve(args.host, args.port))
+
+if __name__ == "__main__":
+    main()
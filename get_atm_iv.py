@@ -0,0 +1,370 @@
+import aiohttp
+import argparse
+import asyncio
+import datetime
+import functools
+import logging
+import os
+import time
+
+import numpy as np
+
+from atm_iv_calc import atm_total_variance, constant_maturity_iv, expiry_forwards, snapshot_grid
+from chain_snapshot import ChainSnapshot
+from csv_writer import install_signal_handlers
+import deribit_api
+from deribit_api import rate_limiter, create_session, get_book_summary_by_currency, get_index_price, get_order_book
+from instrument_cache import InstrumentUniverse
+from response_log import ResponseRecorder
+from metrics import inc, set_total, start_http_server, timed, timer
+from storage import ChangeOnlyStore, open_store, open_term_structure_store
+from scheduler import TickStats, fixed_rate
+from strike_index import StrikeIndex
+
+logging.basicConfig(filename='atm_iv.log', level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
+
+# currencies the collector knows how to poll
+# instrument_currency is what get_instruments is queried with, base_currency picks the chains out of the listing,
+# linear options (SOL_USDC-...) are listed under their settlement currency USDC, so every USDC settled underlying
+# shares one download of just the linear listing,
+# period is the sampling interval in seconds, ticks are aligned to the wall clock
+CURRENCIES = {
+    'BTC': {
+        'instrument_currency': 'BTC',
+        'base_currency': 'BTC',
+        'index_name': 'btc_usd',
+        'csv_file': 'atm_iv_BTC.csv',
+        'period': 1
+    },
+    'ETH': {
+        'instrument_currency': 'ETH',
+        'base_currency': 'ETH',
+        'index_name': 'eth_usd',
+        'csv_file': 'atm_iv_ETH.csv',
+        'period': 1
+    },
+    'SOL': {
+        'instrument_currency': 'USDC',
+        'base_currency': 'SOL',
+        'index_name': 'sol_usd',
+        'csv_file': 'atm_iv_sol.csv',
+        'period': 1
+    }
+}
+
+# seconds before the cached instrument listing is downloaded again
+INSTRUMENTS_TTL = 300
+
+# daily options expire at 08:00 UTC, the collectors follow the expiry of the next UTC day and move on
+# to the one after at UTC midnight, ROLLOVER_LEAD seconds before that the next expiry's chains are made ready
+ROLLOVER_LEAD = 60
+
+# port of the local Prometheus /metrics endpoint, None turns it off
+METRICS_PORT = 9108
+
+# seconds between rate limit usage reports in the log
+RATE_LIMIT_REPORT_INTERVAL = 60
+
+# csv rows are written in batches of CSV_MAX_ROWS or every CSV_MAX_DELAY seconds
+CSV_MAX_ROWS = 60
+CSV_MAX_DELAY = 10
+CSV_DURABILITY = 'flush'
+
+# where the atm iv is read from, 'order_book' fetches the atm instrument's order book after selecting it,
+# 'book_summary' fetches the whole chain in one request alongside the index price and reads the atm iv from it
+ATM_SOURCE = 'order_book'
+
+# with 'book_summary', 'nearest' reports the iv of the strike closest to the index like 'order_book' does,
+# 'interpolated' interpolates total variance between the strikes bracketing the index
+ATM_METHOD = 'nearest'
+
+# constant maturity atm iv series written in 'book_summary' mode, label -> maturity in days
+CONSTANT_MATURITIES = {
+    '24h': 1,
+    '7d': 7
+}
+
+# with 'book_summary', also write the atm iv of every listed expiry each tick to an atm_iv_<currency>_term series,
+# one column per expiry, the snapshot already holds every expiry so this costs no extra request
+TERM_STRUCTURE = False
+
+# 'csv' keeps the flat atm_iv_*.csv files, 'parquet' writes series/date partitions under PARQUET_ROOT
+STORAGE_BACKEND = 'csv'
+PARQUET_ROOT = 'data'
+
+# write a row only when the atm iv changed, plus a heartbeat row every HEARTBEAT seconds,
+# storage.expand_series turns the files back into one row per tick
+CHANGE_ONLY = False
+HEARTBEAT = 60
+
+# series are named atm_iv_<currency> for the atm iv and atm_iv_<currency>_<label> for constant maturities
+def series_name(currency: str, label: str = 'atm'):
+    return f"atm_iv_{currency}" if label == 'atm' else f"atm_iv_{currency}_{label}"
+
+# labels of the values every tick produces
+def tick_labels(source: str = ATM_SOURCE):
+    if source == 'book_summary':
+        return ['atm'] + list(CONSTANT_MATURITIES)
+    return ['atm']
+
+# store holding the series of every currency, constant maturities go next to the currency's csv file
+# directory moves the csv files or the parquet root somewhere else, replays write there
+# change_only wraps it in a ChangeOnlyStore on the period grid of each currency
+def open_atm_store(currencies: list, labels: list = None, backend: str = STORAGE_BACKEND, directory: str = None, change_only: bool = CHANGE_ONLY):
+    series = {}
+    periods = {}
+    for currency in currencies:
+        csv_file = CURRENCIES[currency]['csv_file']
+        for label in labels or tick_labels():
+            file_name = csv_file if label == 'atm' else csv_file.replace('.csv', f"_{label}.csv")
+            if directory is not None:
+                file_name = os.path.join(directory, file_name)
+            series[series_name(currency, label)] = {'csv_file': file_name, 'column': 'ATM IV'}
+            periods[series_name(currency, label)] = CURRENCIES[currency]['period']
+    if backend == 'parquet':
+        store = open_store('parquet', series, root=directory or PARQUET_ROOT)
+    else:
+        store = open_store(backend, series, max_rows=CSV_MAX_ROWS, max_delay=CSV_MAX_DELAY, durability=CSV_DURABILITY)
+    return ChangeOnlyStore(store, periods, HEARTBEAT) if change_only else store
+
+# [start, end) in ms of the UTC day after the given UTC day number, the window its 08:00 UTC expiry falls in
+@functools.lru_cache(maxsize=4)
+def expiry_window(day: int):
+    start = (day + 1) * 86400000
+    return start, start + 86400000
+
+def utc_day(now: float):
+    return int(now // 86400)
+
+# seconds until the collectors switch to the next day's expiry
+def seconds_to_rollover(now: float):
+    return (utc_day(now) + 1) * 86400 - now
+
+# term structure store of every currency, csv files are started next to the currency's csv file
+def open_term_store(currencies: list, backend: str = STORAGE_BACKEND, directory: str = None):
+    series = {}
+    for currency in currencies:
+        file_name = CURRENCIES[currency]['csv_file'].replace('.csv', '_term.csv')
+        if directory is not None:
+            file_name = os.path.join(directory, file_name)
+        series[series_name(currency, 'term')] = {'csv_file': file_name, 'column': 'ATM IV'}
+    if backend == 'parquet':
+        return open_term_structure_store('parquet', series, root=directory or PARQUET_ROOT)
+    return open_term_structure_store(backend, series, max_rows=CSV_MAX_ROWS, max_delay=CSV_MAX_DELAY, durability=CSV_DURABILITY)
+
+# get the chains that expire tomorrow (UTC) from the strike index, now is epoch seconds and defaults to the current time
+def get_tomorrows_instruments(index: StrikeIndex, base_currency: str, now: float = None):
+    start_timestamp, end_timestamp = expiry_window(utc_day(time.time() if now is None else now))
+    return index.chains_between(base_currency, start_timestamp, end_timestamp)
+
+# make sure the chains of the expiry the collector switches to at the next rollover are in the cached listing,
+# downloading the listing again in the background when they are not
+async def prepare_rollover(config: dict, universe: InstrumentUniverse, now: float):
+    currency = config['base_currency']
+    after = now + seconds_to_rollover(now)
+    index = await universe.get_index()
+    if index is not None and not get_tomorrows_instruments(index, currency, after):
+        await universe.prefetch()
+        index = universe.index
+    chains = get_tomorrows_instruments(index, currency, after) if index is not None else []
+    if chains:
+        logging.info(f"{currency} rollover ready, next expiry {chains[0].expiration_timestamp} has {len(chains[0].strikes)} strikes")
+    else:
+        print(f"{currency} no chains listed for the next expiry")
+        logging.warning(f"{currency} no chains listed for the next expiry")
+
+# atm iv of every expiry of a snapshot keyed by expiration timestamp, picked like the 'atm' value of ATM_METHOD
+# but around each expiry's own forward (see expiry_forwards)
+def term_structure(snapshot: ChainSnapshot, index: StrikeIndex, base_currency: str, forwards: np.ndarray, expiries: np.ndarray, times: np.ndarray, total_variance: np.ndarray):
+    if ATM_METHOD == 'interpolated':
+        ivs = 100 * np.sqrt(total_variance / times)
+        return {int(expiry): None if np.isnan(iv) else float(iv) for expiry, iv in zip(expiries, ivs)}
+    values = {}
+    for expiry, forward in zip(expiries, forwards):
+        chain = index.chain(base_currency, int(expiry))
+        if chain is not None:
+            atm_option = chain.instrument(chain.atm_strike(forward))
+            values[int(expiry)] = snapshot.get(atm_option['instrument_name'], 'mark_iv')
+    return values
+
+# get the atm option across the given chains
+def get_atm_option_iv(chains: list, current_price: float):
+    atm_option = None
+    for chain in chains:
+        strike = chain.atm_strike(current_price)
+        if atm_option is None or abs(strike - current_price) < abs(atm_option['strike'] - current_price):
+            atm_option = chain.instrument(strike)
+    return atm_option
+
+# fetch the values of one tick of one currency keyed by label (see tick_labels),
+# returns None when any request of the tick failed
+# now is the epoch time of the tick, replays pass the recorded one
+# with_term_structure (book_summary only) adds 'term' to the values, the atm iv of every expiry (see term_structure)
+async def collect_tick(session: aiohttp.ClientSession, config: dict, universe: InstrumentUniverse, source: str = ATM_SOURCE, now: float = None, with_term_structure: bool = False):
+    now = time.time() if now is None else now
+    if source == 'book_summary':
+        return await collect_tick_from_summary(session, config, universe, now, with_term_structure)
+
+    currency = config['base_currency']
+    index, current_price = await asyncio.gather(
+        timed(universe.get_index(), 'collector_stage_seconds', stage='instruments', currency=currency),
+        timed(get_index_price(session, config['index_name']), 'collector_stage_seconds', stage='index', currency=currency)
+    )
+    if index is None or current_price is None:
+        return None
+
+    with timer('collector_stage_seconds', stage='filter', currency=currency):
+        chains = get_tomorrows_instruments(index, config['base_currency'], now)
+    if not chains:
+        return None
+
+    with timer('collector_stage_seconds', stage='atm_select', currency=currency):
+        atm_option = get_atm_option_iv(chains, current_price)
+
+    atm_instrument_name = atm_option['instrument_name']
+
+    with timer('collector_stage_seconds', stage='order_book', currency=currency):
+        atm_order_book = await get_order_book(session, atm_instrument_name, 1)
+    if atm_order_book is None:
+        return None
+
+    return {'atm': atm_order_book['result']['mark_iv']}
+
+# same as collect_tick but the iv comes from a whole-chain snapshot fetched together with the index price,
+# which also gives the constant maturity values
+async def collect_tick_from_summary(session: aiohttp.ClientSession, config: dict, universe: InstrumentUniverse, now: float, with_term_structure: bool = False):
+    currency = config['base_currency']
+    index, current_price, summary = await asyncio.gather(
+        timed(universe.get_index(), 'collector_stage_seconds', stage='instruments', currency=currency),
+        timed(get_index_price(session, config['index_name']), 'collector_stage_seconds', stage='index', currency=currency),
+        timed(get_book_summary_by_currency(session, config['instrument_currency'], 'option'), 'collector_stage_seconds', stage='book_summary', currency=currency)
+    )
+    if index is None or current_price is None or summary is None:
+        return None
+
+    with timer('collector_stage_seconds', stage='filter', currency=currency):
+        chains = get_tomorrows_instruments(index, config['base_currency'], now)
+    if not chains:
+        return None
+
+    with timer('collector_stage_seconds', stage='snapshot', currency=currency):
+        snapshot = ChainSnapshot(summary, config['base_currency'])
+
+    with timer('collector_stage_seconds', stage='atm_select', currency=currency):
+        expiries, times, strikes, ivs = snapshot_grid(snapshot, int(now * 1000))
+        forwards = expiry_forwards(snapshot, expiries, current_price)
+        total_variance = atm_total_variance(strikes, ivs, forwards, times)
+
+        if ATM_METHOD == 'interpolated':
+            row = np.searchsorted(expiries, chains[0].expiration_timestamp)
+            if row == len(expiries) or expiries[row] != chains[0].expiration_timestamp:
+                return None
+            atm_iv = float(100 * np.sqrt(total_variance[row] / times[row]))
+        else:
+            atm_option = get_atm_option_iv(chains, current_price)
+            atm_iv = snapshot.get(atm_option['instrument_name'], 'mark_iv')
+
+        values = {'atm': atm_iv}
+        targets = np.array(list(CONSTANT_MATURITIES.values()), dtype=np.float64) / 365
+        for label, iv in zip(CONSTANT_MATURITIES, constant_maturity_iv(times, total_variance, targets)):
+            values[label] = None if np.isnan(iv) else float(iv)
+
+    if with_term_structure:
+        with timer('collector_stage_seconds', stage='term_structure', currency=currency):
+            values['term'] = term_structure(snapshot, index, currency, forwards, expiries, times, total_variance)
+    return values
+
+# poll one currency forever on its period grid, every request of a tick is awaited on the shared event loop
+# a failed tick is skipped and logged, it never stops the collector
+# rows are stamped with the scheduled tick time so series of different currencies line up
+# the rollover to the next expiry is prepared in the background ROLLOVER_LEAD seconds ahead
+async def collect(session: aiohttp.ClientSession, currency: str, config: dict, universe: InstrumentUniverse, store, term_store=None):
+    stats = TickStats(currency)
+    prepared_day = None
+    rollover = None
+    async for tick in fixed_rate(config['period'], stats):
+        if seconds_to_rollover(tick) <= ROLLOVER_LEAD and prepared_day != utc_day(tick):
+            prepared_day = utc_day(tick)
+            rollover = asyncio.create_task(prepare_rollover(config, universe, tick))
+        try:
+            with timer('collector_tick_seconds', currency=currency):
+                values = await collect_tick(session, config, universe, now=tick, with_term_structure=term_store is not None)
+
+            if values is None or values['atm'] is None:
+                inc('collector_skipped_ticks_total', currency=currency)
+                print(f"{currency} tick skipped")
+                logging.warning(f"{currency} tick skipped")
+            else:
+                timestamp = datetime.datetime.fromtimestamp(tick)
+                term = values.pop('term', None)
+                with timer('collector_stage_seconds', stage='persist', currency=currency):
+                    for label, value in values.items():
+                        if value is not None:
+                            store.append(series_name(currency, label), timestamp, value)
+                    if term:
+                        term_store.append(series_name(currency, 'term'), timestamp, term)
+
+                print(f"{currency} ATM IV: {values['atm']}")
+                logging.info(f"{currency} ATM IV: {values}")
+
+        except Exception as e:
+            inc('collector_errors_total', currency=currency)
+            print(f"{currency} exception occured: {e}")
+            logging.exception(f"{currency} tick failed")
+
+        with timer('collector_stage_seconds', stage='flush', currency=currency):
+            store.flush_if_due()
+            if term_store is not None:
+                term_store.flush_if_due()
+        set_total('collector_missed_ticks_total', stats.missed, currency=currency)
+        set_total('collector_late_ticks_total', stats.late, currency=currency)
+
+# log the measured credit usage and headroom every RATE_LIMIT_REPORT_INTERVAL seconds
+async def report_rate_limit():
+    while True:
+        await asyncio.sleep(RATE_LIMIT_REPORT_INTERVAL)
+        logging.info(f"Deribit rate limit: {rate_limiter.report()}")
+
+async def run(currencies: list):
+    async with create_session() as session:
+        # one cached listing per get_instruments query, shared by the currencies that use it
+        universes = {}
+        for currency in currencies:
+            instrument_currency = CURRENCIES[currency]['instrument_currency']
+            if instrument_currency not in universes:
+                universes[instrument_currency] = InstrumentUniverse(session, instrument_currency, 'option', INSTRUMENTS_TTL)
+
+        store = open_atm_store(currencies)
+        term_store = open_term_store(currencies) if TERM_STRUCTURE and ATM_SOURCE == 'book_summary' else None
+        try:
+            await asyncio.gather(
+                report_rate_limit(),
+                *(
+                    collect(session, currency, CURRENCIES[currency], universes[CURRENCIES[currency]['instrument_currency']], store, term_store)
+                    for currency in currencies
+                )
+            )
+        finally:
+            store.close()
+            if term_store is not None:
+                term_store.close()
+
+# usage: python get_atm_iv.py [BTC ETH SOL ...] [--record responses]
+def main():
+    parser = argparse.ArgumentParser(description='Collect Deribit ATM IV')
+    parser.add_argument('currencies', nargs='*', help=f"currencies to collect, default {' '.join(CURRENCIES)}")
+    parser.add_argument('--record', metavar='DIRECTORY', default=None, help='also log every raw Deribit response here, see replay_atm_iv.py')
+    args = parser.parse_args()
+    currencies = [currency.upper() for currency in args.currencies] or list(CURRENCIES)
+    for currency in currencies:
+        if currency not in CURRENCIES:
+            raise SystemExit(f"Unknown currency {currency}, expected one of {', '.join(CURRENCIES)}")
+    if args.record is not None:
+        deribit_api.recorder = ResponseRecorder(args.record)
+    install_signal_handlers()
+    if METRICS_PORT is not None:
+        start_http_server(METRICS_PORT)
+    asyncio.run(run(currencies))
+
+if __name__ == "__main__":
+    main()
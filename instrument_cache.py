@@ -0,0 +1,80 @@
+import aiohttp
+import asyncio
+import time
+
+from deribit_api import get_instruments
+from deribit_decode import decode_instruments
+from strike_index import StrikeIndex
+
+# cached instrument listing for one get_instruments query
+# the listing only changes when contracts are listed or expire, so it is refreshed
+# when the ttl runs out or as soon as the nearest expiry in the cached listing has passed
+# clock returns the current epoch time in seconds, replays pass the replayed time
+class InstrumentUniverse:
+    def __init__(self, session: aiohttp.ClientSession, currency: str, kind: str = 'option', ttl: float = 300, clock=time.time):
+        self.session = session
+        self.clock = clock
+        self.currency = currency
+        self.kind = kind
+        self.ttl = ttl
+        self.data = None
+        self.index = None
+        self.fetched_at = 0.0
+        self.next_expiry = None
+        self._lock = asyncio.Lock()
+        self._refreshing = None
+
+    # true when the cached listing has to be downloaded again
+    def is_stale(self):
+        if self.data is None:
+            return True
+        now = self.clock()
+        if now - self.fetched_at >= self.ttl:
+            return True
+        if self.next_expiry is not None and now * 1000 >= self.next_expiry:
+            return True
+        return False
+
+    async def refresh(self):
+        data = await get_instruments(self.session, self.currency, self.kind, 'false', decode_instruments)
+        if data is None:
+            # keep serving the previous listing, the next call will try again
+            return self.data
+        self.data = data
+        self.index = StrikeIndex(data)
+        self.fetched_at = self.clock()
+        # expiries that already passed can still be listed until they settle, counting them
+        # would make the listing stale again right after every refresh
+        upcoming = [self.index.next_expiry(base_currency, self.fetched_at * 1000) for base_currency in self.index.expiries]
+        upcoming = [expiry for expiry in upcoming if expiry is not None]
+        self.next_expiry = min(upcoming) if upcoming else None
+        return self.data
+
+    # return the strike index of the listing, refreshing it the same way as get
+    async def get_index(self):
+        await self.get()
+        return self.index
+
+    # return the listing as an InstrumentTable
+    # only the very first call waits for the download, a stale listing keeps being served
+    # while its replacement downloads in the background so ticks never wait on a refresh
+    async def get(self):
+        if self.data is None:
+            # several collectors can share one universe, only the first one downloads
+            async with self._lock:
+                if self.data is None:
+                    await self.refresh()
+            return self.data
+        if self.is_stale():
+            self.prefetch()
+        return self.data
+
+    # start downloading a new listing in the background unless one is already on its way
+    def prefetch(self):
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.create_task(self._refresh_locked())
+        return self._refreshing
+
+    async def _refresh_locked(self):
+        async with self._lock:
+            return await self.refresh()
@@ -0,0 +1,205 @@
+import numpy as np
+
+MS_PER_YEAR = 365 * 24 * 3600 * 1000
+
+# volatility bracket of the solver, prices implying a vol outside it come back as nan
+MIN_VOL = 1e-4
+MAX_VOL = 10.0
+TOLERANCE = 1e-10
+# an option whose last step was smaller than this is done once the step is taken
+STEP_TOLERANCE = 1e-5
+MAX_ITERATIONS = 100
+
+# Hart's rational approximation of the normal tail as given by West, accurate to double precision
+CDF_NUMERATOR = (3.52624965998911e-02, 0.700383064443688, 6.37396220353165, 33.912866078383, 112.079291497871, 221.213596169931, 220.206867912376)
+CDF_DENOMINATOR = (8.83883476483184e-02, 1.75566716318264, 16.064177579207, 86.7807322029461, 296.564248779674, 637.333633378831, 793.826512519948, 440.413735824752)
+
+SQRT_2PI = np.sqrt(2 * np.pi)
+
+# standard normal cdf and density, numpy has no erf and this avoids a scipy dependency
+# the polynomials are evaluated in place since this is the hot spot of the solver, and the density
+# is the exp(-x * x / 2) the tail is built on, so pricing and vega share one exp
+def norm_cdf_pdf(x: np.ndarray):
+    x = np.asarray(x, dtype=np.float64)
+    # the tail is exactly 0 beyond 37, clipping keeps the polynomials from overflowing
+    ax = np.minimum(np.abs(x), 38.0)
+
+    numerator = ax * CDF_NUMERATOR[0]
+    numerator += CDF_NUMERATOR[1]
+    for coefficient in CDF_NUMERATOR[2:]:
+        numerator *= ax
+        numerator += coefficient
+    denominator = ax * CDF_DENOMINATOR[0]
+    denominator += CDF_DENOMINATOR[1]
+    for coefficient in CDF_DENOMINATOR[2:]:
+        denominator *= ax
+        denominator += coefficient
+
+    density = np.multiply(ax, ax, out=np.empty_like(x))
+    density *= -0.5
+    np.exp(density, out=density)
+    tail = numerator
+    tail *= density
+    tail /= denominator
+
+    # continued fraction beyond 5 * sqrt(2), exactly 0 beyond 37; only the few options this far
+    # out are gathered, the check is one pass over ax
+    far = ax >= 7.07106781186547
+    if far.any():
+        a = ax[far]
+        fraction = a + 0.65
+        for coefficient in (4, 3, 2, 1):
+            fraction = a + coefficient / fraction
+        tail[far] = np.where(a > 37, 0.0, density[far] / fraction / SQRT_2PI)
+    # |1 - tail| = 1 - tail above 0 and |0 - tail| = tail below, cheaper than a masked subtract or np.where
+    np.subtract(x > 0, tail, out=tail)
+    np.abs(tail, out=tail)
+    density /= SQRT_2PI
+    return tail, density
+
+def norm_cdf(x: np.ndarray):
+    return norm_cdf_pdf(x)[0]
+
+def norm_pdf(x: np.ndarray):
+    return np.exp(-x * x / 2) / SQRT_2PI
+
+# undiscounted Black-76 price and vega, vols as decimals and times in years
+def black76(forwards, strikes, times, vols, is_call):
+    sqrt_time = np.sqrt(times)
+    std = vols * sqrt_time
+    with np.errstate(divide='ignore', invalid='ignore'):
+        d1 = (np.log(forwards / strikes) + std * std / 2) / std
+    d2 = d1 - std
+    call = forwards * norm_cdf(d1) - strikes * norm_cdf(d2)
+    # put from put-call parity
+    price = np.where(is_call, call, call - forwards + strikes)
+    vega = forwards * norm_pdf(d1) * sqrt_time
+    return price, vega
+
+# Corrado-Miller approximation as the starting point, falling back to Manaster-Koehler
+# where it is not positive; its square root goes negative away from the money and is clamped at 0,
+# which still starts within ~20% of the vol where the inflection point of Manaster-Koehler is often 3x off
+def initial_vol(forwards, strikes, times, is_call, prices):
+    calls = np.where(is_call, prices, prices + forwards - strikes)
+    half_moneyness = (forwards - strikes) / 2
+    term = calls - half_moneyness
+    with np.errstate(invalid='ignore'):
+        root = np.sqrt(np.maximum(term * term - 4 * half_moneyness * half_moneyness / np.pi, 0.0))
+        corrado_miller = SQRT_2PI / (forwards + strikes) * (term + root) / np.sqrt(times)
+    manaster_koehler = np.sqrt(2 * np.abs(np.log(forwards / strikes)) / times)
+    vol = np.where(np.isfinite(corrado_miller) & (corrado_miller > 0), corrado_miller, manaster_koehler)
+    return np.clip(np.where(vol > 0, vol, 0.5), 0.01, 5.0)
+
+# Black-76 implied vol of every option at once, Halley steps kept inside a per-option bracket
+# that falls back to bisection whenever a step would leave it or vega vanishes
+# prices are undiscounted and in the same unit as forwards and strikes, rate discounts them first,
+# the result is in decimals with nan where the price violates the no-arbitrage bounds
+def implied_vol(prices, forwards, strikes, times, is_call, rate: float = 0.0):
+    arrays = np.broadcast_arrays(
+        np.asarray(prices, dtype=np.float64), np.asarray(forwards, dtype=np.float64),
+        np.asarray(strikes, dtype=np.float64), np.asarray(times, dtype=np.float64), np.asarray(is_call, dtype=bool)
+    )
+    shape = arrays[0].shape
+    prices, forwards, strikes, times, is_call = (array.ravel() for array in arrays)
+    if rate:
+        prices = prices * np.exp(rate * times)
+
+    # solve on the out of the money side of put-call parity, in the money prices are mostly
+    # intrinsic value and their time value is lost to rounding
+    intrinsic = np.where(is_call, forwards - strikes, strikes - forwards)
+    otm_call = strikes >= forwards
+    otm_prices = np.where(intrinsic > 0, prices - intrinsic, prices)
+    upper = np.where(otm_call, forwards, strikes)
+    solvable = (times > 0) & (otm_prices > 0) & (otm_prices < upper) & np.isfinite(otm_prices)
+
+    vol = np.full(prices.shape, np.nan)
+    position = np.flatnonzero(solvable)
+    f, k, t, c, target = forwards[position], strikes[position], times[position], otm_call[position], otm_prices[position]
+    v = initial_vol(f, k, t, c, target)
+    # everything that does not depend on the vol is computed once, the out of the money price is
+    # sign * (F N(sign d1) - K N(sign d2)) with sign +1 for calls and -1 for puts
+    log_moneyness = np.log(f / k)
+    sqrt_time = np.sqrt(t)
+    sign = np.where(c, 1.0, -1.0)
+    lo = np.full(len(position), MIN_VOL)
+    hi = np.full(len(position), MAX_VOL)
+    finished = np.zeros(len(position), dtype=bool)
+
+    for _ in range(MAX_ITERATIONS):
+        n = len(position)
+        if n == 0:
+            break
+        std = v * sqrt_time
+        signed_d = np.empty(2 * n)
+        d1 = np.divide(log_moneyness, std, out=signed_d[:n])
+        d1 += std / 2
+        np.multiply(sign, std, out=signed_d[n:])
+        d1 *= sign
+        np.subtract(d1, signed_d[n:], out=signed_d[n:])
+        # N(sign d1) and N(sign d2) in one pass, the density of d1 is the density of sign d1
+        cdf, density = norm_cdf_pdf(signed_d)
+        price = f * cdf[:n]
+        price -= k * cdf[n:]
+        price *= sign
+        vega = f * density[:n]
+        vega *= sqrt_time
+
+        diff = price - target
+        np.copyto(lo, v, where=diff < 0)
+        np.copyto(hi, v, where=diff > 0)
+        # Halley on log price, far better behaved than price itself in the wings: with g = log(price / target)
+        # and r = price / vega the step is g r / (1 - g (volga r / vega - 1) / 2), volga / vega = d1 d2 / vol
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            error = np.log(price / target)
+            ratio = np.divide(price, vega, out=price)
+            curvature = np.multiply(signed_d[:n], signed_d[n:], out=signed_d[:n])
+            curvature /= v
+            curvature *= ratio
+            curvature -= 1
+            curvature *= error
+            curvature *= -0.5
+            curvature += 1
+            # far from the root the correction is no better than Newton, keep it within a factor of 2
+            np.clip(curvature, 0.5, 2.0, out=curvature)
+            step = np.multiply(error, ratio, out=error)
+            step /= curvature
+            step = np.subtract(v, step, out=step)
+        bisect = ~((step > lo) & (step < hi))
+        if bisect.any():
+            np.copyto(step, (lo + hi) / 2, where=bisect)
+        finished |= np.abs(diff) <= TOLERANCE * target
+        finished |= hi - lo < TOLERANCE
+        # Halley converges cubically, after a step below STEP_TOLERANCE the vol is within ~TOLERANCE
+        # so the step is taken without pricing it again
+        small_step = ~bisect & (np.abs(step - v) < STEP_TOLERANCE)
+        np.copyto(v, step, where=~finished)
+        finished |= small_step
+
+        # drop finished options once they are a quarter of the working set, gathering every
+        # iteration would cost more than pricing a few converged options again
+        if np.count_nonzero(finished) * 4 >= n:
+            vol[position[finished]] = v[finished]
+            keep = ~finished
+            position, f, k, target, log_moneyness, sqrt_time, sign, lo, hi, v = (
+                array[keep] for array in (position, f, k, target, log_moneyness, sqrt_time, sign, lo, hi, v)
+            )
+            finished = finished[keep]
+
+    vol[position] = v
+    return vol.reshape(shape)
+
+# bid, ask and mid implied vols (in percent, like Deribit's) of a ChainSnapshot
+# inverse chains (BTC-..., ETH-...) quote prices in the underlying, linear ones (SOL_USDC-...) in USDC,
+# underlying_price is the forward of each expiry and index_price fills in where it is missing
+def chain_implied_vols(snapshot, index_price: float, now_ms: int, inverse: bool = None):
+    if inverse is None:
+        inverse = len(snapshot) > 0 and '_' not in snapshot.instrument_names[0].split('-')[0]
+    forwards = np.where(np.isnan(snapshot.underlying_price), index_price, snapshot.underlying_price)
+    times = (snapshot.expiration_timestamp - now_ms) / MS_PER_YEAR
+    scale = forwards if inverse else 1.0
+    mid_price = (snapshot.bid_price + snapshot.ask_price) / 2
+
+    vols = {}
+    for label, price in (('bid_iv', snapshot.bid_price), ('ask_iv', snapshot.ask_price), ('mid_iv', mid_price)):
+        vols[label] = 100 * implied_vol(price * scale, forwards, snapshot.strike, times, snapshot.is_call)
+    return vols
@@ -0,0 +1,125 @@
+import contextlib
+import http.server
+import threading
+import time
+
+# latency buckets in seconds, from a fast in-memory stage to a slow request
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# help text of every metric the collectors export
+METRIC_HELP = {
+    'collector_stage_seconds': 'Time spent in each stage of a collector tick',
+    'collector_tick_seconds': 'Time spent on a whole collector tick',
+    'uniswap_multicall_seconds': 'Time spent in one Multicall3 eth_call reading a batch of Uniswap pools',
+    'collector_errors_total': 'Ticks that raised an exception',
+    'collector_skipped_ticks_total': 'Ticks that produced no row because a request failed',
+    'collector_missed_ticks_total': 'Scheduled ticks skipped because the previous tick overran',
+    'collector_late_ticks_total': 'Scheduled ticks that fired later than the tolerance',
+    'uniswap_blocks_total': 'Blocks whose pool state was read in block driven mode',
+    'uniswap_skipped_blocks_total': 'Blocks skipped because they were more than MAX_CATCHUP_BLOCKS behind the head',
+    'uniswap_head_block': 'Latest block number seen by the block driven Uniswap collector',
+    'uniswap_get_logs_seconds': 'Time spent in one eth_getLogs request of the swap ingester',
+    'uniswap_split_ranges_total': 'eth_getLogs block ranges split in half because the node refused their size',
+    'uniswap_swaps_block': 'Last block of the contiguous range the swap ingester has written'
+}
+
+_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+
+def _key(labels: dict):
+    return tuple(sorted(labels.items()))
+
+# record one value in the histogram name{labels}
+def observe(name: str, value: float, **labels):
+    with _lock:
+        series = _histograms.setdefault(name, {})
+        histogram = series.get(_key(labels))
+        if histogram is None:
+            histogram = series[_key(labels)] = [[0] * len(DEFAULT_BUCKETS), 0.0, 0]
+        buckets, _, _ = histogram
+        for i, bound in enumerate(DEFAULT_BUCKETS):
+            if value <= bound:
+                buckets[i] += 1
+        histogram[1] += value
+        histogram[2] += 1
+
+def inc(name: str, amount: float = 1, **labels):
+    with _lock:
+        series = _counters.setdefault(name, {})
+        series[_key(labels)] = series.get(_key(labels), 0) + amount
+
+# set a counter that is kept somewhere else (like TickStats) to its current total
+def set_total(name: str, value: float, **labels):
+    with _lock:
+        _counters.setdefault(name, {})[_key(labels)] = value
+
+def set_gauge(name: str, value: float, **labels):
+    with _lock:
+        _gauges.setdefault(name, {})[_key(labels)] = value
+
+# time the body of a with block into the histogram name{labels}
+@contextlib.contextmanager
+def timer(name: str, **labels):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+# await a coroutine and time it, for stages that run concurrently under asyncio.gather
+async def timed(awaitable, name: str, **labels):
+    start = time.perf_counter()
+    try:
+        return await awaitable
+    finally:
+        observe(name, time.perf_counter() - start, **labels)
+
+def _format_labels(key: tuple, extra: dict = None):
+    items = list(key) + list((extra or {}).items())
+    if not items:
+        return ''
+    return '{' + ','.join(f'{label}="{value}"' for label, value in items) + '}'
+
+# every metric in the Prometheus text exposition format
+def render():
+    lines = []
+    with _lock:
+        for name, series in sorted(_histograms.items()):
+            lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, (buckets, total, count) in sorted(series.items()):
+                for bound, bucket in zip(DEFAULT_BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{_format_labels(key, {'le': bound})} {bucket}")
+                lines.append(f"{name}_bucket{_format_labels(key, {'le': '+Inf'})} {count}")
+                lines.append(f"{name}_sum{_format_labels(key)} {total}")
+                lines.append(f"{name}_count{_format_labels(key)} {count}")
+        for kind, metrics in (('counter', _counters), ('gauge', _gauges)):
+            for name, series in sorted(metrics.items()):
+                lines.append(f"# HELP {name} {METRIC_HELP.get(name, name)}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(series.items()):
+                    lines.append(f"{name}{_format_labels(key)} {value}")
+    return '\n'.join(lines) + '\n'
+
+class MetricsHandler(http.server.BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path != '/metrics':
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/plain; version=0.0.4')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+# serve /metrics from a daemon thread so scrapes never wait on the collectors' event loop
+def start_http_server(port: int, host: str = '127.0.0.1'):
+    server = http.server.ThreadingHTTPServer((host, port), MetricsHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
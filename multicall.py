@@ -0,0 +1,28 @@
+from eth_abi import decode, encode
+from hexbytes import HexBytes
+
+# Multicall3, deployed at the same address on mainnet and most other chains
+MULTICALL3_ADDRESS = '0xcA11bde05977b3631167028862bE2a173976CA11'
+
+# tryBlockAndAggregate(bool requireSuccess, (address target, bytes callData)[] calls)
+#   returns (uint256 blockNumber, bytes32 blockHash, (bool success, bytes returnData)[] results)
+# every call runs against the same block, the one the eth_call is made at, and it is returned with the results
+TRY_BLOCK_AND_AGGREGATE_SELECTOR = '0x399542e9'
+
+# calldata of one tryBlockAndAggregate over calls as (target address, calldata hex), failed calls don't revert the rest
+def encode_calls(calls: list):
+    arguments = encode(['bool', '(address,bytes)[]'], [False, [(target, HexBytes(data)) for target, data in calls]])
+    return TRY_BLOCK_AND_AGGREGATE_SELECTOR + arguments.hex()
+
+# (block number, block hash, [(success, return data bytes)]) from the eth_call result
+def decode_result(result: str):
+    block_number, block_hash, results = decode(['uint256', 'bytes32', '(bool,bytes)[]'], HexBytes(result))
+    return block_number, '0x' + block_hash.hex(), results
+
+# the arguments of a tryBlockAndAggregate calldata, used by the stand-in node
+def decode_calls(data: str):
+    _, calls = decode(['bool', '(address,bytes)[]'], HexBytes(data)[4:])
+    return [(target, '0x' + calldata.hex()) for target, calldata in calls]
+
+def encode_result(block_number: int, block_hash: bytes, results: list):
+    return '0x' + encode(['uint256', 'bytes32', '(bool,bytes)[]'], [block_number, block_hash, results]).hex()
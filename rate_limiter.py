@@ -0,0 +1,122 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import random
+import time
+
+# Deribit's credit system for non matching engine requests: every account (or ip) holds up to
+# 50000 credits refilled at 10000 per second and a request costs 500, so 20 requests/s sustained
+CREDIT_CAPACITY = 50000
+CREDIT_REFILL_RATE = 10000
+
+# credits per request of each endpoint, anything not listed costs DEFAULT_COST
+DEFAULT_COST = 500
+ENDPOINT_COSTS = {
+    '/get_index_price': 500,
+    '/get_order_book': 500,
+    '/get_book_summary_by_currency': 500,
+    # the full listing is the heaviest public call, keep it expensive so refreshes don't crowd out ticks
+    '/get_instruments': 1500
+}
+
+# lower runs first, atm price fetches beat universe refreshes
+DEFAULT_PRIORITY = 1
+ENDPOINT_PRIORITIES = {
+    '/get_index_price': 0,
+    '/get_order_book': 0,
+    '/get_book_summary_by_currency': 0,
+    '/get_instruments': 2
+}
+
+# seconds of history behind the reported usage
+USAGE_WINDOW = 60
+
+# full jitter exponential backoff before retry attempt + 1, shared by every client that retries
+def backoff_delay(attempt: int, base: float, cap: float):
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+# token bucket shared by every Deribit request of the process
+# waiting requests are released strictly by priority and then in arrival order
+class RequestScheduler:
+    def __init__(self, capacity: float = CREDIT_CAPACITY, refill_rate: float = CREDIT_REFILL_RATE,
+                 costs: dict = ENDPOINT_COSTS, priorities: dict = ENDPOINT_PRIORITIES):
+        self.capacity = capacity
+        self.refill_rate = refill_rate
+        self.costs = costs
+        self.priorities = priorities
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.waiters = []
+        self.dispatcher = None
+        self._order = itertools.count()
+        self.usage = collections.deque()
+        self.requests = 0
+        self.waited = 0
+        self.wait_time = 0.0
+        self.throttled = 0
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.refill_rate)
+        self.updated = now
+
+    def take(self, cost: float):
+        self.tokens -= cost
+        self.requests += 1
+        self.usage.append((time.monotonic(), cost))
+
+    # wait until the endpoint's cost can be paid, callers with a higher priority go first
+    async def acquire(self, endpoint: str):
+        # a cost above the capacity could never be paid
+        cost = min(self.costs.get(endpoint, DEFAULT_COST), self.capacity)
+        self.refill()
+        if not self.waiters and self.tokens >= cost:
+            self.take(cost)
+            return
+        started = time.monotonic()
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.waiters, (self.priorities.get(endpoint, DEFAULT_PRIORITY), next(self._order), cost, future))
+        if self.dispatcher is None or self.dispatcher.done():
+            self.dispatcher = asyncio.create_task(self.dispatch())
+        await future
+        self.waited += 1
+        self.wait_time += time.monotonic() - started
+
+    async def dispatch(self):
+        while self.waiters:
+            self.refill()
+            priority, order, cost, future = self.waiters[0]
+            if future.cancelled():
+                heapq.heappop(self.waiters)
+                continue
+            if self.tokens >= cost:
+                heapq.heappop(self.waiters)
+                self.take(cost)
+                future.set_result(None)
+                continue
+            await asyncio.sleep((cost - self.tokens) / self.refill_rate)
+
+    # the server said we are over the limit, assume the bucket is empty
+    def penalize(self):
+        self.refill()
+        self.tokens = min(self.tokens, 0)
+        self.throttled += 1
+
+    # measured usage over the last USAGE_WINDOW seconds, headroom is the share of the refill rate still unused
+    def report(self):
+        now = time.monotonic()
+        while self.usage and now - self.usage[0][0] > USAGE_WINDOW:
+            self.usage.popleft()
+        self.refill()
+        used_rate = sum(cost for _, cost in self.usage) / USAGE_WINDOW
+        return {
+            'credits': round(self.tokens),
+            'used_per_second': round(used_rate),
+            'headroom': round(1 - used_rate / self.refill_rate, 3),
+            'requests': self.requests,
+            'waited': self.waited,
+            'wait_time': round(self.wait_time, 3),
+            'queued': len(self.waiters),
+            'throttled': self.throttled
+        }
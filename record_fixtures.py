@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import json
+import os
+
+from web3 import Web3
+
+from deribit_api import create_session, get
+from get_atm_iv import CURRENCIES
+from stand_in_servers import POOL_VIEW_SELECTORS
+from uniswap_collector import POOLS as UNISWAP_POOLS
+
+# pools whose views are captured, the ones uniswap_collector.py polls
+POOLS = [pool['address'] for pool in UNISWAP_POOLS.values()]
+
+def dump(directory: str, name: str, body: dict):
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, f"{name}.json"), mode='w') as file:
+        json.dump(body, file)
+
+# capture one response of every Deribit call the collectors make, in the layout stand_in_servers.py serves
+async def record_deribit(fixtures: str):
+    directory = os.path.join(fixtures, 'deribit')
+    async with create_session() as session:
+        for instrument_currency in sorted({config['instrument_currency'] for config in CURRENCIES.values()}):
+            instruments = await get(session, '/get_instruments', {'currency': instrument_currency, 'kind': 'option', 'expired': 'false'})
+            dump(os.path.join(directory, 'get_instruments'), instrument_currency, instruments)
+            summary = await get(session, '/get_book_summary_by_currency', {'currency': instrument_currency, 'kind': 'option'})
+            dump(os.path.join(directory, 'get_book_summary_by_currency'), instrument_currency, summary)
+        for config in CURRENCIES.values():
+            index_price = await get(session, '/get_index_price', {'index_name': config['index_name']})
+            dump(os.path.join(directory, 'get_index_price'), config['index_name'], index_price)
+        # one order book stands in for every instrument
+        order_book = await get(session, '/get_order_book', {'instrument_name': instruments['result'][0]['instrument_name'], 'depth': 1})
+        dump(os.path.join(directory, 'get_order_book'), 'default', order_book)
+
+def record_ethereum(fixtures: str, rpc_url: str):
+    w3 = Web3(Web3.HTTPProvider(rpc_url))
+    for pool in POOLS:
+        for view, selector in POOL_VIEW_SELECTORS.items():
+            result = w3.eth.call({'to': pool, 'data': selector})
+            dump(os.path.join(fixtures, 'eth'), f"{view}_{pool}", {'result': '0x' + bytes(result).hex()})
+
+# usage: python record_fixtures.py [--fixtures fixtures] [--rpc-url URL]
+def main():
+    parser = argparse.ArgumentParser(description='Capture Deribit and Ethereum RPC responses for benchmark.py')
+    parser.add_argument('--fixtures', default='fixtures')
+    parser.add_argument('--rpc-url', default=None, help='Ethereum JSON-RPC url, pool views are skipped without one')
+    args = parser.parse_args()
+    asyncio.run(record_deribit(args.fixtures))
+    if args.rpc_url:
+        record_ethereum(args.fixtures, args.rpc_url)
+
+if __name__ == "__main__":
+    main()
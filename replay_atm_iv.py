@@ -0,0 +1,130 @@
+import argparse
+import asyncio
+import datetime
+import heapq
+import logging
+import math
+import os
+import time
+
+import deribit_api
+from get_atm_iv import ATM_SOURCE, CURRENCIES, INSTRUMENTS_TTL, STORAGE_BACKEND, collect_tick, open_atm_store, series_name, tick_labels
+from instrument_cache import InstrumentUniverse
+from rate_limiter import RequestScheduler
+from response_log import ReplaySession, read_responses
+
+# pushes a response log recorded with get_atm_iv.py --record back through collect_tick and an atm store
+# every recorded get_index_price of a currency marks one tick on its period grid, a tick is replayed once
+# every response received before the next grid point has been read, so it sees what the live tick saw
+# speed is the replay rate relative to recorded time, 0 replays as fast as possible
+class AtmIvReplay:
+    def __init__(self, currencies: list, store, source: str = ATM_SOURCE, speed: float = 0.0):
+        self.currencies = currencies
+        self.store = store
+        self.source = source
+        self.speed = speed
+        self.session = ReplaySession()
+        self.now = 0.0
+        self.universes = {}
+        for currency in currencies:
+            instrument_currency = CURRENCIES[currency]['instrument_currency']
+            if instrument_currency not in self.universes:
+                self.universes[instrument_currency] = InstrumentUniverse(self.session, instrument_currency, 'option', INSTRUMENTS_TTL, lambda: self.now)
+        self.by_index = {CURRENCIES[currency]['index_name']: currency for currency in currencies}
+        self.pending = []
+        self.scheduled = set()
+        self.ticks = {currency: 0 for currency in currencies}
+        self.skipped = {currency: 0 for currency in currencies}
+        self.started = None
+
+    def schedule(self, received: float, params: dict):
+        currency = self.by_index.get(params.get('index_name'))
+        if currency is None:
+            return
+        period = CURRENCIES[currency]['period']
+        tick = math.floor(received / period) * period
+        if (currency, tick) not in self.scheduled:
+            self.scheduled.add((currency, tick))
+            heapq.heappush(self.pending, (tick, currency))
+
+    # wait until the tick is due in replayed time
+    async def pace(self, tick: float):
+        if self.started is None:
+            self.started = (time.monotonic(), tick)
+        if self.speed > 0:
+            delay = self.started[0] + (tick - self.started[1]) / self.speed - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+    async def run_tick(self, tick: float, currency: str):
+        self.scheduled.discard((currency, tick))
+        await self.pace(tick)
+        config = CURRENCIES[currency]
+        self.now = tick
+        self.session.tick_start = tick
+        values = await collect_tick(self.session, config, self.universes[config['instrument_currency']], self.source, tick)
+        self.ticks[currency] += 1
+        if values is None or values['atm'] is None:
+            self.skipped[currency] += 1
+            logging.warning(f"{currency} replayed tick {datetime.datetime.fromtimestamp(tick).isoformat()} skipped")
+            return
+        timestamp = datetime.datetime.fromtimestamp(tick)
+        for label, value in values.items():
+            if value is not None:
+                self.store.append(series_name(currency, label), timestamp, value)
+        self.store.flush_if_due()
+
+    # run every tick whose period ended before received
+    async def run_due(self, received: float):
+        while self.pending and self.pending[0][0] + CURRENCIES[self.pending[0][1]]['period'] <= received:
+            await self.run_tick(*heapq.heappop(self.pending))
+
+    async def replay(self, records):
+        for received, endpoint, params, body in records:
+            await self.run_due(received)
+            self.session.add(received, endpoint, params, body)
+            if endpoint == '/get_index_price':
+                self.schedule(received, params)
+        await self.run_due(math.inf)
+        self.store.flush()
+
+# usage: python replay_atm_iv.py responses --output replay [--currencies BTC ETH] [--speed 10] [--source book_summary]
+def main():
+    parser = argparse.ArgumentParser(description='Replay recorded Deribit responses through the ATM IV collector')
+    parser.add_argument('record', help='response log file or directory written by get_atm_iv.py --record')
+    parser.add_argument('--output', required=True, help='directory the replayed series are written to')
+    parser.add_argument('--currencies', nargs='*', default=list(CURRENCIES))
+    parser.add_argument('--source', choices=['order_book', 'book_summary'], default=ATM_SOURCE)
+    parser.add_argument('--backend', choices=['csv', 'parquet'], default=STORAGE_BACKEND)
+    parser.add_argument('--speed', type=float, default=0.0, help='multiple of recorded time, 0 replays as fast as possible')
+    parser.add_argument('--start', type=datetime.datetime.fromisoformat, default=None)
+    parser.add_argument('--end', type=datetime.datetime.fromisoformat, default=None)
+    args = parser.parse_args()
+
+    currencies = [currency.upper() for currency in args.currencies]
+    for currency in currencies:
+        if currency not in CURRENCIES:
+            raise SystemExit(f"Unknown currency {currency}, expected one of {', '.join(CURRENCIES)}")
+
+    os.makedirs(args.output, exist_ok=True)
+    # recorded responses were already paid for, nothing to pace
+    deribit_api.rate_limiter = RequestScheduler(float('inf'), float('inf'))
+    store = open_atm_store(currencies, tick_labels(args.source), args.backend, args.output)
+    replay = AtmIvReplay(currencies, store, args.source, args.speed)
+    records = read_responses(
+        args.record,
+        args.start.timestamp() if args.start else None,
+        args.end.timestamp() if args.end else None
+    )
+    started = time.perf_counter()
+    try:
+        asyncio.run(replay.replay(records))
+    finally:
+        store.close()
+    elapsed = time.perf_counter() - started
+    for currency in currencies:
+        print(f"{currency}: {replay.ticks[currency]} ticks replayed, {replay.skipped[currency]} skipped")
+    print(f"{replay.session.answered} responses answered, {replay.session.missing} not recorded, {elapsed:.1f}s")
+
+if __name__ == "__main__":
+    main()
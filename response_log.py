@@ -0,0 +1,129 @@
+import atexit
+import datetime
+import glob
+import gzip
+import json
+import os
+import time
+
+from deribit_decode import loads
+
+# raw Deribit REST responses as one gzip'd jsonl file per UTC day
+#   <directory>/responses-<YYYY-MM-DD>.jsonl.gz
+# every line is {"received": epoch seconds, "endpoint": ..., "params": {...}, "body": <response as sent>}
+# the body is copied byte for byte so replay decodes exactly what the collector decoded
+
+# listings stay valid until a newer one is recorded, every other response only answers the tick it was fetched for
+SNAPSHOT_ENDPOINTS = {'/get_instruments'}
+
+def params_key(endpoint: str, params: dict):
+    return endpoint + json.dumps(params, sort_keys=True, separators=(',', ':'))
+
+# appends responses to the log of the day they were received
+# the gzip stream is synced every max_delay seconds so a crash loses at most that much,
+# reopening after a restart adds a new gzip member to the same file
+# one recorder per directory, two processes must not share one
+class ResponseRecorder:
+    def __init__(self, directory: str, max_delay: float = 10.0, compresslevel: int = 6):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_delay = max_delay
+        self.compresslevel = compresslevel
+        self.file = None
+        self.date = None
+        self.synced = time.monotonic()
+        self.records = 0
+        atexit.register(self.close)
+
+    def record(self, endpoint: str, params: dict, body: bytes, received: float = None):
+        received = time.time() if received is None else received
+        date = datetime.datetime.fromtimestamp(received, datetime.timezone.utc).date()
+        if date != self.date:
+            self.close()
+            self.date = date
+            path = os.path.join(self.directory, f"responses-{date.isoformat()}.jsonl.gz")
+            self.file = gzip.open(path, 'ab', compresslevel=self.compresslevel)
+        # raw newlines can only be json whitespace, keep one record per line
+        body = body.strip().replace(b'\n', b' ')
+        header = json.dumps({'received': round(received, 6), 'endpoint': endpoint, 'params': params}, separators=(',', ':'))
+        self.file.write(header[:-1].encode() + b',"body":' + body + b'}\n')
+        self.records += 1
+        if time.monotonic() - self.synced >= self.max_delay:
+            self.file.flush()
+            self.synced = time.monotonic()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+# yield (received, endpoint, params, body) of every record of a log file or directory in file order,
+# optionally only the ones received in [start, end)
+def read_responses(path: str, start: float = None, end: float = None):
+    files = sorted(glob.glob(os.path.join(path, 'responses-*.jsonl.gz'))) if os.path.isdir(path) else [path]
+    for file_name in files:
+        with gzip.open(file_name, 'rb') as file:
+            try:
+                for line in file:
+                    head, _, body = line.partition(b',"body":')
+                    if not body:
+                        continue
+                    header = loads(head + b'}')
+                    received = header['received']
+                    if start is not None and received < start:
+                        continue
+                    if end is not None and received >= end:
+                        return
+                    yield received, header['endpoint'], header['params'], body.rstrip()[:-1]
+            except EOFError:
+                # the last member of a log that was still being written when it was copied
+                continue
+
+# what ReplaySession hands to deribit_api.get in place of an aiohttp response
+class ReplayResponse:
+    def __init__(self, status: int, body: bytes):
+        self.status = status
+        self.body = body
+
+    async def read(self):
+        return self.body
+
+    async def text(self):
+        return self.body.decode()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+# stands in for the aiohttp session of the collectors during replay
+# answers every request with the latest recorded response for the same endpoint and params,
+# responses of tick scoped endpoints only count when they were received at or after tick_start
+class ReplaySession:
+    def __init__(self):
+        self.latest = {}
+        self.tick_start = 0.0
+        self.answered = 0
+        self.missing = 0
+
+    def add(self, received: float, endpoint: str, params: dict, body: bytes):
+        self.latest[params_key(endpoint, params)] = (received, endpoint, body)
+
+    def get(self, url: str, params: dict = None):
+        endpoint = url[url.rindex('/'):]
+        response = self.latest.get(params_key(endpoint, params or {}))
+        if response is None or (endpoint not in SNAPSHOT_ENDPOINTS and response[0] < self.tick_start):
+            self.missing += 1
+            return ReplayResponse(404, b'{"error":"not recorded"}')
+        self.answered += 1
+        return ReplayResponse(200, response[2])
+
+    async def close(self):
+        pass
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
@@ -0,0 +1,51 @@
+import asyncio
+import datetime
+import logging
+import math
+import time
+
+# counters of one fixed rate loop
+class TickStats:
+    def __init__(self, name: str):
+        self.name = name
+        self.ticks = 0
+        self.missed = 0
+        self.late = 0
+        self.max_lateness = 0.0
+
+    def __repr__(self):
+        return f"TickStats({self.name}: ticks={self.ticks} missed={self.missed} late={self.late} max_lateness={self.max_lateness:.3f}s)"
+
+# first point of the period grid (aligned to the epoch, so to whole seconds / minutes) at or after now
+def next_grid_point(period: float, now: float):
+    return math.ceil(now / period) * period
+
+# yields the scheduled wall clock time of every tick of a period grid, the sleep is shortened
+# by however long the caller's work took so the loop never drifts
+# ticks whose grid point passed while the previous tick was still working are skipped and counted
+async def fixed_rate(period: float, stats: TickStats = None, late_tolerance: float = None):
+    stats = stats or TickStats('fixed_rate')
+    late_tolerance = period / 10 if late_tolerance is None else late_tolerance
+    target = next_grid_point(period, time.time())
+    while True:
+        delay = target - time.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        stats.ticks += 1
+        lateness = time.time() - target
+        stats.max_lateness = max(stats.max_lateness, lateness)
+        if lateness > late_tolerance:
+            stats.late += 1
+            logging.warning(f"{stats.name} tick {datetime.datetime.fromtimestamp(target).isoformat()} fired {lateness:.3f}s late")
+        yield target
+
+        now = time.time()
+        next_target = target + period
+        if now >= next_target:
+            # the work overran one or more grid points, skip them rather than firing back to back
+            skipped = int((now - next_target) // period) + 1
+            stats.missed += skipped
+            first = datetime.datetime.fromtimestamp(next_target).isoformat()
+            logging.warning(f"{stats.name} missed {skipped} tick(s) from {first}, work took {now - target:.3f}s")
+            next_target += skipped * period
+        target = next_target
@@ -0,0 +1,205 @@
+import asyncio
+import json
+import os
+import threading
+import time
+
+from aiohttp import web
+
+from multicall import MULTICALL3_ADDRESS, TRY_BLOCK_AND_AGGREGATE_SELECTOR, decode_calls, encode_result
+
+# local stand-ins for the Deribit REST api and an Ethereum JSON-RPC node that answer from fixture files
+# fixtures live under one directory:
+#   deribit/<endpoint>/<key>.json  the full response body, key is the currency or index_name parameter,
+#                                  get_order_book uses default.json for every instrument
+#   eth/<view>_<pool address>.json  {"result": "0x..."} as returned by eth_call of the pool view,
+#                                   view is one of POOL_VIEW_SELECTORS
+# Multicall3 tryBlockAndAggregate calls are answered from the same fixtures, views without one fail
+# with block_time the Ethereum stand-in mines a block every block_time seconds and pushes it to
+# eth_subscribe newHeads subscribers on a websocket at the same url
+# eth_getLogs makes up one Uniswap v3 Swap every swap_every blocks for every address asked for, and refuses
+# queries of more than MAX_LOGS logs the way hosted nodes do
+
+# the parameter that picks the fixture file of each endpoint
+DERIBIT_FIXTURE_KEYS = {
+    'get_instruments': 'currency',
+    'get_index_price': 'index_name',
+    'get_book_summary_by_currency': 'currency'
+}
+
+SLOT0_SELECTOR = '0x3850c7bd'
+
+# Uniswap v3 pool views the Ethereum stand-in answers
+POOL_VIEW_SELECTORS = {
+    'slot0': SLOT0_SELECTOR,
+    'liquidity': '0x1a686502',
+    'feeGrowthGlobal0X128': '0xf3058399',
+    'feeGrowthGlobal1X128': '0x46141319'
+}
+
+def load_json(file_name: str):
+    with open(file_name) as file:
+        return json.load(file)
+
+def deribit_app(fixtures: str):
+    cache = {}
+
+    def fixture(endpoint: str, key: str):
+        file_name = os.path.join(fixtures, 'deribit', endpoint, f"{key}.json")
+        if file_name not in cache:
+            cache[file_name] = load_json(file_name) if os.path.exists(file_name) else None
+        return cache[file_name]
+
+    async def handle(request):
+        endpoint = request.match_info['endpoint']
+        parameter = DERIBIT_FIXTURE_KEYS.get(endpoint)
+        body = fixture(endpoint, request.query.get(parameter, '') if parameter else 'default')
+        if body is None:
+            return web.json_response({'error': {'message': f"no fixture for {request.path_qs}"}}, status=400)
+        if endpoint == 'get_order_book':
+            body = dict(body, result=dict(body['result'], instrument_name=request.query.get('instrument_name')))
+        return web.json_response(body)
+
+    app = web.Application()
+    app.router.add_get('/api/v2/public/{endpoint}', handle)
+    return app
+
+SWAP_TOPIC = '0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67'
+MAX_LOGS = 10000
+
+# timestamp of block 0 of the stand-in chain, blocks are 12 seconds apart
+GENESIS_TIMESTAMP = 1438269973
+
+def ethereum_app(fixtures: str, chain_id: int = 1, block_number: int = 20000000, block_time: float = None, swap_every: int = 10):
+    started = time.monotonic()
+    # (selector, pool address) -> result hex
+    views = {}
+    directory = os.path.join(fixtures, 'eth')
+    if os.path.isdir(directory):
+        for file_name in os.listdir(directory):
+            view, _, address = file_name[:-len('.json')].partition('_')
+            if view in POOL_VIEW_SELECTORS:
+                views[(POOL_VIEW_SELECTORS[view], address.lower())] = load_json(os.path.join(directory, file_name))['result']
+
+    def head():
+        if block_time is None:
+            return block_number
+        return block_number + int((time.monotonic() - started) / block_time)
+
+    def header(number: int):
+        return {'number': hex(number), 'hash': '0x' + number.to_bytes(32, 'big').hex(), 'timestamp': hex(GENESIS_TIMESTAMP + 12 * number)}
+
+    def swap(address: str, number: int):
+        amount0 = (number * 7919) % 10 ** 12 - 5 * 10 ** 11
+        words = [amount0 % 2 ** 256, (-amount0 * 3) % 2 ** 256, 2 ** 96 + number, 10 ** 18 + number, (number % 1000 - 500) % 2 ** 256]
+        topic = '0x' + '00' * 12 + address[2:].lower()
+        return {
+            'address': address.lower(), 'topics': [SWAP_TOPIC, topic, topic],
+            'data': '0x' + ''.join(f"{word:064x}" for word in words),
+            'blockNumber': hex(number), 'blockHash': '0x' + number.to_bytes(32, 'big').hex(),
+            'transactionHash': '0x' + (number * 65537).to_bytes(32, 'big').hex(),
+            'transactionIndex': '0x0', 'logIndex': '0x0', 'removed': False
+        }
+
+    # every pool swaps in the blocks congruent to its own offset modulo swap_every
+    def logs(query: dict):
+        first = int(query.get('fromBlock', hex(head())), 16)
+        last = int(query.get('toBlock', hex(head())), 16)
+        addresses = query.get('address') or []
+        addresses = [addresses] if isinstance(addresses, str) else addresses
+        topics = query.get('topics') or [None]
+        if topics[0] not in (None, SWAP_TOPIC):
+            return []
+        blocks = {}
+        for address in addresses:
+            offset = int(address[-4:], 16) % swap_every
+            blocks[address] = range(first + (offset - first) % swap_every, last + 1, swap_every)
+        if sum(len(numbers) for numbers in blocks.values()) > MAX_LOGS:
+            raise ValueError(f"query returned more than {MAX_LOGS} results")
+        found = [swap(address, number) for address, numbers in blocks.items() for number in numbers]
+        found.sort(key=lambda log: (int(log['blockNumber'], 16), log['address']))
+        return found
+
+    def view(target: str, data: str):
+        return views.get((data[:10], target.lower()))
+
+    def multicall(data: str, block: str):
+        number = int(block, 16) if block.startswith('0x') else head()
+        results = []
+        for target, calldata in decode_calls(data):
+            result = view(target, calldata)
+            results.append((result is not None, bytes.fromhex(result[2:]) if result else b''))
+        return encode_result(number, number.to_bytes(32, 'big'), results)
+
+    def answer(request: dict):
+        method = request['method']
+        if method == 'eth_chainId':
+            return hex(chain_id)
+        if method == 'eth_blockNumber':
+            return hex(head())
+        if method == 'eth_getBlockByNumber':
+            block = request['params'][0]
+            return header(int(block, 16) if block.startswith('0x') else head())
+        if method == 'eth_call':
+            call = request['params'][0]
+            data = call.get('data', call.get('input', ''))
+            block = request['params'][1] if len(request['params']) > 1 else 'latest'
+            if call['to'].lower() == MULTICALL3_ADDRESS.lower() and data.startswith(TRY_BLOCK_AND_AGGREGATE_SELECTOR):
+                return multicall(data, block)
+            return view(call['to'], data)
+        if method == 'eth_getLogs':
+            return logs(request['params'][0])
+        return None
+
+    def respond(request: dict):
+        try:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'result': answer(request)}
+        except ValueError as e:
+            return {'jsonrpc': '2.0', 'id': request.get('id'), 'error': {'code': -32005, 'message': str(e)}}
+
+    async def subscribe(request):
+        websocket = web.WebSocketResponse()
+        await websocket.prepare(request)
+        message = await websocket.receive_json()
+        if message.get('method') != 'eth_subscribe' or message['params'][0] != 'newHeads':
+            await websocket.send_json({'jsonrpc': '2.0', 'id': message.get('id'), 'error': {'code': -32601, 'message': 'only newHeads'}})
+            return websocket
+        await websocket.send_json({'jsonrpc': '2.0', 'id': message.get('id'), 'result': '0x1'})
+        last = None
+        while not websocket.closed:
+            number = head()
+            if number != last:
+                last = number
+                await websocket.send_json({'jsonrpc': '2.0', 'method': 'eth_subscription', 'params': {'subscription': '0x1', 'result': header(number)}})
+            await asyncio.sleep(min(block_time or 1.0, 1.0) / 4)
+        return websocket
+
+    async def handle(request):
+        body = await request.json()
+        requests = body if isinstance(body, list) else [body]
+        responses = [respond(item) for item in requests]
+        return web.json_response(responses if isinstance(body, list) else responses[0])
+
+    app = web.Application()
+    app.router.add_post('/', handle)
+    app.router.add_get('/', subscribe)
+    return app
+
+# run an aiohttp app on its own event loop in a daemon thread, for callers that block (web3, benchmarks)
+# returns the base url once the server is listening
+def serve_in_thread(app: web.Application, host: str = '127.0.0.1', port: int = 0):
+    ready = threading.Event()
+    address = {}
+
+    async def start():
+        runner = web.AppRunner(app)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        address['port'] = site._server.sockets[0].getsockname()[1]
+        ready.set()
+        await asyncio.Event().wait()
+
+    threading.Thread(target=lambda: asyncio.run(start()), daemon=True).start()
+    ready.wait()
+    return f"http://{host}:{address['port']}"
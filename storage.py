@@ -0,0 +1,350 @@
+import atexit
+import csv
+import datetime
+import glob
+import os
+import time
+
+from csv_writer import BufferedCsvWriter
+
+# pyarrow is only needed for the parquet backend
+try:
+    import pyarrow as pa
+    import pyarrow.compute
+    import pyarrow.dataset as ds
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+
+# every store takes the series it writes as a dict of
+#   series name -> {'csv_file': path of the csv output, 'column': header of the value column}
+# and exposes append / flush_if_due / flush / close with one (timestamp, value) row per call
+# a series may also list 'extra_columns', headers of integer columns (a block number) written after the value,
+# append then takes their values after the value; parquet names them in lower case
+
+# flat csv files, one per series, same layout the collectors always wrote
+class CsvStore:
+    def __init__(self, series: dict, max_rows: int = 100, max_delay: float = 5.0, durability: str = 'flush'):
+        self.series = series
+        self.writers = {
+            name: BufferedCsvWriter(config['csv_file'], ['Timestamp', config['column']] + config.get('extra_columns', []), max_rows, max_delay, durability)
+            for name, config in series.items()
+        }
+
+    def append(self, name: str, timestamp: datetime.datetime, value: float, *extra):
+        self.writers[name].write_row([timestamp.isoformat(), value, *extra])
+
+    def flush_if_due(self):
+        for writer in self.writers.values():
+            writer.flush_if_due()
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.flush()
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+# typed parquet files partitioned by series and date
+#   <root>/series=<name>/date=<YYYY-MM-DD>/part-<first timestamp in ms>.parquet
+#   <root>/series=<name>/date=<YYYY-MM-DD>/day.parquet
+# rows are buffered per series and every flush writes one row group as its own part file,
+# so a crash loses at most the rows still in memory; once a series moves on to a new date, when the store
+# closes, and for every earlier date when it opens, the parts of a date are compacted into day.parquet
+# so a month is read from about 30 files instead of one per flush
+class ParquetStore:
+    schema = None
+
+    def __init__(self, root: str, series: dict, row_group_size: int = 3600, max_delay: float = 300):
+        if pa is None:
+            raise ImportError('the parquet backend needs pyarrow, pip install pyarrow')
+        if ParquetStore.schema is None:
+            ParquetStore.schema = pa.schema([('timestamp', pa.timestamp('us')), ('value', pa.float64())])
+        self.root = root
+        self.series = series
+        self.row_group_size = row_group_size
+        self.max_delay = max_delay
+        self.buffers = {name: ([], [], []) for name in series}
+        self.oldest = {}
+        self.dates = {}
+        for name in series:
+            compact_series(root, name, datetime.date.today())
+        atexit.register(self.close)
+
+    def append(self, name: str, timestamp: datetime.datetime, value: float, *extra):
+        timestamps, values, extras = self.buffers[name]
+        if not timestamps:
+            self.oldest[name] = time.monotonic()
+        timestamps.append(timestamp)
+        values.append(value)
+        extras.append(extra)
+        if len(timestamps) >= self.row_group_size:
+            self.flush_series(name)
+
+    def flush_series(self, name: str):
+        timestamps, values, extras = self.buffers[name]
+        if not timestamps:
+            return
+        # a row group never spans two dates, split it at midnight
+        start = 0
+        for i in range(1, len(timestamps) + 1):
+            if i == len(timestamps) or timestamps[i].date() != timestamps[start].date():
+                self.write_row_group(name, timestamps[start:i], values[start:i], extras[start:i])
+                self.finish_date(name, timestamps[start].date())
+                start = i
+        self.buffers[name] = ([], [], [])
+        self.oldest.pop(name, None)
+
+    def write_row_group(self, name: str, timestamps: list, values: list, extras: list):
+        directory = os.path.join(self.root, f"series={name}", f"date={timestamps[0].date().isoformat()}")
+        os.makedirs(directory, exist_ok=True)
+        file_name = os.path.join(directory, f"part-{int(timestamps[0].timestamp() * 1000)}.parquet")
+        extra_columns = self.series[name].get('extra_columns', [])
+        schema = self.schema
+        for column in extra_columns:
+            schema = schema.append(pa.field(column.lower(), pa.int64()))
+        columns = [pa.array(timestamps, pa.timestamp('us')), pa.array(values, pa.float64())]
+        columns += [pa.array(column, pa.int64()) for column in zip(*extras)] if extra_columns else []
+        pq.write_table(pa.Table.from_arrays(columns, schema=schema), file_name)
+
+    # compact the date a series was writing once its rows have moved on to a later one
+    def finish_date(self, name: str, date: datetime.date):
+        previous = self.dates.get(name)
+        if previous is not None and previous < date:
+            compact_partition(os.path.join(self.root, f"series={name}", f"date={previous.isoformat()}"))
+        if previous is None or previous < date:
+            self.dates[name] = date
+
+    def flush_if_due(self):
+        now = time.monotonic()
+        for name, oldest in list(self.oldest.items()):
+            if now - oldest >= self.max_delay:
+                self.flush_series(name)
+
+    def flush(self):
+        for name in self.series:
+            self.flush_series(name)
+
+    def close(self):
+        self.flush()
+        for name, date in self.dates.items():
+            compact_partition(os.path.join(self.root, f"series={name}", f"date={date.isoformat()}"))
+        self.dates = {}
+
+# merge the part files of one date partition into day.parquet sorted by timestamp, a day.parquet
+# from an earlier compaction is merged too; columns missing from some parts (term structures) are null
+# the merged file replaces day.parquet before the parts are removed, a crash in between can leave
+# the rows of the removed parts twice, never lose them
+def compact_partition(directory: str):
+    parts = sorted(glob.glob(os.path.join(directory, 'part-*.parquet')))
+    if not parts:
+        return
+    day_file = os.path.join(directory, 'day.parquet')
+    files = ([day_file] if os.path.exists(day_file) else []) + parts
+    table = pa.concat_tables([pq.read_table(file_name) for file_name in files], promote_options='default').sort_by('timestamp')
+    # hidden from dataset discovery while it is written
+    temporary = os.path.join(directory, '.day.parquet.tmp')
+    pq.write_table(table, temporary)
+    os.replace(temporary, day_file)
+    for file_name in parts:
+        os.remove(file_name)
+
+# compact every date partition of a series before the date before
+def compact_series(root: str, name: str, before: datetime.date):
+    for directory in sorted(glob.glob(os.path.join(root, f"series={name}", 'date=*'))):
+        if directory.rsplit('date=', 1)[1] < before.isoformat():
+            compact_partition(directory)
+
+# writes a row only when its value differs from the last row written, or heartbeat seconds after it,
+# wraps any store of single values; periods maps series name -> sampling period in seconds
+# a tick arriving more than one period late, and closing the store, writes a None row one period after
+# the last tick, so a reader knows where the value stopped holding; expand_series restores the full grid
+class ChangeOnlyStore:
+    def __init__(self, store, periods: dict, heartbeat: float = 60):
+        self.store = store
+        self.series = store.series
+        self.periods = periods
+        self.heartbeat = heartbeat
+        self.written = {}
+        self.previous = {}
+        atexit.register(self.close)
+
+    def append(self, name: str, timestamp: datetime.datetime, value: float):
+        period = datetime.timedelta(seconds=self.periods[name])
+        previous = self.previous.get(name)
+        if previous is not None and timestamp - previous > 1.5 * period:
+            self.write(name, previous + period, None)
+        written = self.written.get(name)
+        if written is None or value != written[1] or (timestamp - written[0]).total_seconds() >= self.heartbeat:
+            self.write(name, timestamp, value)
+        self.previous[name] = timestamp
+
+    def write(self, name: str, timestamp: datetime.datetime, value: float):
+        self.store.append(name, timestamp, value)
+        self.written[name] = (timestamp, value)
+
+    def flush_if_due(self):
+        self.store.flush_if_due()
+
+    def flush(self):
+        self.store.flush()
+
+    def close(self):
+        for name, previous in list(self.previous.items()):
+            if self.written[name] != (previous + datetime.timedelta(seconds=self.periods[name]), None):
+                self.write(name, previous + datetime.timedelta(seconds=self.periods[name]), None)
+        self.previous = {}
+        self.store.close()
+
+# (timestamp, value) rows of a collector csv file, empty values are None, extra columns are left out
+def read_csv_series(file_name: str):
+    with open(file_name, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        return [(datetime.datetime.fromisoformat(timestamp), float(value) if value else None) for timestamp, value, *_ in reader]
+
+# expand rows written by ChangeOnlyStore back to one row per period: every value holds until the next row,
+# None rows end it and are dropped, the last row stands alone because nothing says how long it held
+def expand_series(rows, period: float):
+    step = datetime.timedelta(seconds=period)
+    expanded = []
+    rows = list(rows)
+    for (timestamp, value), (next_timestamp, _) in zip(rows, rows[1:] + [(None, None)]):
+        if value is None:
+            continue
+        expanded.append((timestamp, value))
+        if next_timestamp is None:
+            continue
+        timestamp += step
+        while timestamp < next_timestamp:
+            expanded.append((timestamp, value))
+            timestamp += step
+    return expanded
+
+# term structures: one row per tick holding the atm iv of every listed expiry, one column per expiry
+# named by its expiration timestamp in ms; append takes {expiration_timestamp: value}
+# the columns change when expiries are listed or expire, the stores then start a new file so every file has one header
+
+# csv term structures, every set of expiries gets its own file next to csv_file, <csv_file stem>_<first timestamp>.csv
+class TermStructureCsvStore:
+    def __init__(self, series: dict, max_rows: int = 100, max_delay: float = 5.0, durability: str = 'flush'):
+        self.series = series
+        self.max_rows = max_rows
+        self.max_delay = max_delay
+        self.durability = durability
+        self.writers = {}
+        self.expiries = {}
+
+    def append(self, name: str, timestamp: datetime.datetime, values: dict):
+        expiries = sorted(values)
+        if expiries != self.expiries.get(name):
+            self.start_file(name, timestamp, expiries)
+        self.writers[name].write_row([timestamp.isoformat()] + [values[expiry] for expiry in expiries])
+
+    def start_file(self, name: str, timestamp: datetime.datetime, expiries: list):
+        writer = self.writers.pop(name, None)
+        if writer is not None:
+            writer.close()
+        stem, extension = os.path.splitext(self.series[name]['csv_file'])
+        file_name = f"{stem}_{timestamp.strftime('%Y%m%dT%H%M%S')}{extension}"
+        header = ['Timestamp'] + [str(expiry) for expiry in expiries]
+        self.writers[name] = BufferedCsvWriter(file_name, header, self.max_rows, self.max_delay, self.durability)
+        self.expiries[name] = expiries
+
+    def flush_if_due(self):
+        for writer in self.writers.values():
+            writer.flush_if_due()
+
+    def flush(self):
+        for writer in self.writers.values():
+            writer.flush()
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+# parquet term structures in the partition layout of ParquetStore, a row group is also cut when the expiries change
+class TermStructureParquetStore(ParquetStore):
+    def __init__(self, root: str, series: dict, row_group_size: int = 3600, max_delay: float = 300):
+        super().__init__(root, series, row_group_size, max_delay)
+        self.expiries = {}
+
+    def append(self, name: str, timestamp: datetime.datetime, values: dict):
+        expiries = sorted(values)
+        if expiries != self.expiries.get(name):
+            self.flush_series(name)
+            self.expiries[name] = expiries
+        super().append(name, timestamp, [values[expiry] for expiry in expiries])
+
+    def write_row_group(self, name: str, timestamps: list, values: list, extras: list):
+        directory = os.path.join(self.root, f"series={name}", f"date={timestamps[0].date().isoformat()}")
+        os.makedirs(directory, exist_ok=True)
+        file_name = os.path.join(directory, f"part-{int(timestamps[0].timestamp() * 1000)}.parquet")
+        columns = [pa.array(timestamps, pa.timestamp('us'))]
+        columns += [pa.array(column, pa.float64()) for column in zip(*values)]
+        names = ['timestamp'] + [str(expiry) for expiry in self.expiries[name]]
+        pq.write_table(pa.Table.from_arrays(columns, names=names), file_name)
+
+# read a term structure back as one pyarrow table sorted by timestamp, expiries missing from a file are null
+def read_term_structure(root: str, name: str, start: datetime.datetime = None, end: datetime.datetime = None):
+    if pa is None:
+        raise ImportError('reading parquet series needs pyarrow, pip install pyarrow')
+    tables = []
+    for directory in sorted(glob.glob(os.path.join(root, f"series={name}", 'date=*'))):
+        date = directory.rsplit('date=', 1)[1]
+        if (start is not None and date < start.date().isoformat()) or (end is not None and date > end.date().isoformat()):
+            continue
+        for file_name in sorted(glob.glob(os.path.join(directory, '*.parquet'))):
+            tables.append(pq.read_table(file_name))
+    if not tables:
+        return None
+    table = pa.concat_tables(tables, promote_options='default')
+    expiries = sorted((column for column in table.column_names if column != 'timestamp'), key=int)
+    table = table.select(['timestamp'] + expiries).sort_by('timestamp')
+    if start is not None:
+        table = table.filter(pa.compute.greater_equal(table.column('timestamp'), pa.scalar(start, pa.timestamp('us'))))
+    if end is not None:
+        table = table.filter(pa.compute.less(table.column('timestamp'), pa.scalar(end, pa.timestamp('us'))))
+    return table
+
+# read a series back as a pyarrow table sorted by timestamp, only the partitions
+# overlapping [start, end) are opened; extra_columns adds those columns of the series to timestamp and value
+def read_series(root: str, name: str, start: datetime.datetime = None, end: datetime.datetime = None, extra_columns: list = None):
+    if pa is None:
+        raise ImportError('reading parquet series needs pyarrow, pip install pyarrow')
+    directory = os.path.join(root, f"series={name}")
+    dataset = ds.dataset(directory, format='parquet', partitioning=ds.partitioning(pa.schema([('date', pa.string())]), flavor='hive'))
+    expression = None
+    if start is not None:
+        expression = (ds.field('date') >= start.date().isoformat()) & (ds.field('timestamp') >= pa.scalar(start, pa.timestamp('us')))
+    if end is not None:
+        end_expression = (ds.field('date') <= end.date().isoformat()) & (ds.field('timestamp') < pa.scalar(end, pa.timestamp('us')))
+        expression = end_expression if expression is None else expression & end_expression
+    table = dataset.to_table(columns=['timestamp', 'value'] + [column.lower() for column in extra_columns or []], filter=expression)
+    return table.sort_by('timestamp')
+
+# write a parquet series out in the csv layout of the collectors
+def export_csv(root: str, name: str, file_name: str, column: str, start: datetime.datetime = None, end: datetime.datetime = None):
+    table = read_series(root, name, start, end)
+    with open(file_name, mode='w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(['Timestamp', column])
+        for timestamp, value in zip(table.column('timestamp').to_pylist(), table.column('value').to_pylist()):
+            writer.writerow([timestamp.isoformat(), value])
+
+# build the store selected by backend, 'csv' or 'parquet'
+def open_store(backend: str, series: dict, **options):
+    if backend == 'csv':
+        return CsvStore(series, **options)
+    if backend == 'parquet':
+        return ParquetStore(options.pop('root', 'data'), series, **options)
+    raise ValueError(f"unknown storage backend {backend!r}, expected 'csv' or 'parquet'")
+
+# same as open_store for term structure series
+def open_term_structure_store(backend: str, series: dict, **options):
+    if backend == 'csv':
+        return TermStructureCsvStore(series, **options)
+    if backend == 'parquet':
+        return TermStructureParquetStore(options.pop('root', 'data'), series, **options)
+    raise ValueError(f"unknown storage backend {backend!r}, expected 'csv' or 'parquet'")
@@ -0,0 +1,236 @@
+import argparse
+import asyncio
+import datetime
+import itertools
+import json
+import logging
+import time
+
+import websockets
+
+from deribit_api import create_session
+from csv_writer import install_signal_handlers
+from get_atm_iv import CURRENCIES, INSTRUMENTS_TTL, ROLLOVER_LEAD, open_atm_store, open_term_store, series_name, seconds_to_rollover, get_tomorrows_instruments, get_atm_option_iv
+from instrument_cache import InstrumentUniverse
+from scheduler import TickStats, fixed_rate
+
+ws_url = 'wss://www.deribit.com/ws/api/v2'
+
+# seconds to wait before reconnecting a dropped websocket
+RECONNECT_DELAY = 1
+
+# per currency state of the stream, the ticker subscription follows the atm instrument
+# standby_channel is the atm ticker of the next expiry, subscribed during the last ROLLOVER_LEAD seconds
+# before the rollover so its notifications are already flowing when it becomes the atm ticker
+# with a term structure, term_channels maps the atm ticker of every listed expiry to its expiration timestamp
+# and term holds the latest mark iv of each
+class CurrencyStream:
+    def __init__(self, currency: str, config: dict, universe: InstrumentUniverse):
+        self.currency = currency
+        self.config = config
+        self.universe = universe
+        self.index_channel = f"deribit_price_index.{config['index_name']}"
+        self.ticker_channel = None
+        self.standby_channel = None
+        self.term_channels = {}
+        self.term = {}
+        self.subscribed = set()
+        self.current_price = None
+        self.series = series_name(currency)
+        self.term_series = series_name(currency, 'term')
+
+# streams atm iv for several currencies over one Deribit JSON-RPC websocket
+# index price notifications pick the atm instrument, its ticker notifications carry mark_iv
+# with a term_store the atm ticker of every expiry is followed too and the latest iv of all of them
+# is written every term_period seconds, only the tickers whose atm strike moved are resubscribed
+class AtmIvStreamer:
+    def __init__(self, streams: list, store, url: str = ws_url, record_file: str = None, term_store=None, term_period: float = 1):
+        self.streams = streams
+        self.store = store
+        self.term_store = term_store
+        self.term_period = term_period
+        self.url = url
+        self.record_file = record_file
+        self.channels = {}
+        self.websocket = None
+        self._ids = itertools.count(1)
+        self._record = None
+
+    async def send(self, method: str, params: dict):
+        message = {'jsonrpc': '2.0', 'id': next(self._ids), 'method': method, 'params': params}
+        await self.websocket.send(json.dumps(message))
+
+    async def subscribe(self, channels: list):
+        await self.send('public/subscribe', {'channels': channels})
+
+    async def unsubscribe(self, channels: list):
+        await self.send('public/unsubscribe', {'channels': channels})
+
+    # move the ticker subscription when the index crosses into a new atm strike
+    async def on_index(self, stream: CurrencyStream, data: dict):
+        stream.current_price = data['price']
+        index = await stream.universe.get_index()
+        if index is None:
+            return
+        now = time.time()
+        ticker_channel = self.atm_channel(stream, index, now)
+        if ticker_channel is None:
+            return
+        standby_channel = None
+        if seconds_to_rollover(now) <= ROLLOVER_LEAD:
+            standby_channel = self.atm_channel(stream, index, now + seconds_to_rollover(now))
+        term_channels = self.term_channels(stream, index, now) if self.term_store is not None else {}
+        await self.follow(stream, ticker_channel, standby_channel if standby_channel != ticker_channel else None, term_channels)
+
+    # ticker channel of the atm instrument of the expiry followed at now
+    def atm_channel(self, stream: CurrencyStream, index, now: float):
+        chains = get_tomorrows_instruments(index, stream.config['base_currency'], now)
+        if not chains:
+            return None
+        atm_option = get_atm_option_iv(chains, stream.current_price)
+        return f"ticker.{atm_option['instrument_name']}.100ms"
+
+    # ticker channel of the atm instrument of every expiry that has not expired at now
+    def term_channels(self, stream: CurrencyStream, index, now: float):
+        channels = {}
+        base_currency = stream.config['base_currency']
+        for expiry in index.expiries.get(base_currency, []):
+            if expiry > now * 1000:
+                chain = index.chain(base_currency, expiry)
+                atm_option = chain.instrument(chain.atm_strike(stream.current_price))
+                channels[f"ticker.{atm_option['instrument_name']}.100ms"] = expiry
+        return channels
+
+    # keep exactly the atm, standby and term structure tickers subscribed
+    async def follow(self, stream: CurrencyStream, ticker_channel: str, standby_channel: str, term_channels: dict):
+        wanted = ({ticker_channel, standby_channel} | set(term_channels)) - {None}
+        if ticker_channel != stream.ticker_channel:
+            logging.info(f"{stream.currency} ATM ticker: {ticker_channel}")
+        stream.ticker_channel = ticker_channel
+        stream.standby_channel = standby_channel
+        stream.term_channels = term_channels
+        # an expiry whose atm strike moved keeps its last iv until the new ticker reports
+        expiries = set(term_channels.values())
+        stream.term = {expiry: iv for expiry, iv in stream.term.items() if expiry in expiries}
+        removed = list(stream.subscribed - wanted)
+        added = list(wanted - stream.subscribed)
+        stream.subscribed = wanted
+        for channel in removed:
+            del self.channels[channel]
+        for channel in added:
+            self.channels[channel] = stream
+        if removed:
+            await self.unsubscribe(removed)
+        if added:
+            await self.subscribe(added)
+
+    def on_ticker(self, stream: CurrencyStream, data: dict):
+        atm_iv = data['mark_iv']
+        timestamp = datetime.datetime.now()
+        self.store.append(stream.series, timestamp, atm_iv)
+        self.store.flush_if_due()
+        print(f"{stream.currency} ATM IV: {atm_iv}")
+        logging.info(f"{stream.currency} ATM IV: {atm_iv}")
+
+    async def on_message(self, message: dict):
+        if message.get('method') != 'subscription':
+            if 'error' in message:
+                logging.error(f"Deribit websocket error: {message['error']}")
+            return
+        channel = message['params']['channel']
+        stream = self.channels.get(channel)
+        if stream is None:
+            # late notification for a channel we already left
+            return
+        data = message['params']['data']
+        if channel == stream.index_channel:
+            await self.on_index(stream, data)
+            return
+        if channel == stream.ticker_channel:
+            self.on_ticker(stream, data)
+        expiry = stream.term_channels.get(channel)
+        if expiry is not None:
+            stream.term[expiry] = data['mark_iv']
+
+    # write the latest term structure of every currency on the term_period grid
+    async def sample_term_structure(self):
+        async for tick in fixed_rate(self.term_period, TickStats('term_structure')):
+            timestamp = datetime.datetime.fromtimestamp(tick)
+            for stream in self.streams:
+                if stream.term:
+                    values = {expiry: stream.term.get(expiry) for expiry in stream.term_channels.values()}
+                    self.term_store.append(stream.term_series, timestamp, values)
+            self.term_store.flush_if_due()
+
+    async def run_once(self):
+        async with websockets.connect(self.url) as websocket:
+            self.websocket = websocket
+            self.channels = {stream.index_channel: stream for stream in self.streams}
+            for stream in self.streams:
+                stream.ticker_channel = None
+                stream.standby_channel = None
+                stream.term_channels = {}
+                stream.subscribed = set()
+            await self.subscribe(list(self.channels))
+            async for raw in websocket:
+                if self._record is not None:
+                    self._record.write(json.dumps({'received': time.time(), 'message': json.loads(raw)}) + '\n')
+                await self.on_message(json.loads(raw))
+
+    # stream forever, reconnecting and resubscribing when the socket drops
+    async def run(self):
+        if self.record_file is not None:
+            self._record = open(self.record_file, mode='a')
+        sampler = asyncio.create_task(self.sample_term_structure()) if self.term_store is not None else None
+        try:
+            while True:
+                try:
+                    await self.run_once()
+                except (OSError, websockets.ConnectionClosed) as e:
+                    print(f"Websocket disconnected: {e}")
+                    logging.warning(f"Websocket disconnected: {e}")
+                await asyncio.sleep(RECONNECT_DELAY)
+        finally:
+            if sampler is not None:
+                sampler.cancel()
+            if self._record is not None:
+                self._record.close()
+
+async def run_stream(currencies: list, url: str = ws_url, record_file: str = None, term_structure: bool = False):
+    async with create_session() as session:
+        universes = {}
+        streams = []
+        for currency in currencies:
+            config = CURRENCIES[currency]
+            instrument_currency = config['instrument_currency']
+            if instrument_currency not in universes:
+                universes[instrument_currency] = InstrumentUniverse(session, instrument_currency, 'option', INSTRUMENTS_TTL)
+            streams.append(CurrencyStream(currency, config, universes[instrument_currency]))
+
+        # ticker notifications don't follow a period grid, every one of them is written
+        store = open_atm_store(currencies, ['atm'], change_only=False)
+        term_store = open_term_store(currencies) if term_structure else None
+        try:
+            await AtmIvStreamer(streams, store, url, record_file, term_store).run()
+        finally:
+            store.close()
+            if term_store is not None:
+                term_store.close()
+
+# usage: python stream_atm_iv.py [BTC ETH SOL ...] [--ws-url URL] [--record FILE] [--term-structure]
+def main():
+    parser = argparse.ArgumentParser(description='Stream ATM IV over the Deribit websocket')
+    parser.add_argument('currencies', nargs='*', default=list(CURRENCIES))
+    parser.add_argument('--ws-url', default=ws_url)
+    parser.add_argument('--record', default=None, help='append every received message to this file for deribit_ws_replay.py')
+    parser.add_argument('--term-structure', action='store_true', help='also write the atm iv of every listed expiry every second')
+    args = parser.parse_args()
+    currencies = [currency.upper() for currency in args.currencies]
+    for currency in currencies:
+        if currency not in CURRENCIES:
+            raise SystemExit(f"Unknown currency {currency}, expected one of {', '.join(CURRENCIES)}")
+    install_signal_handlers()
+    asyncio.run(run_stream(currencies, args.ws_url, args.record, args.term_structure))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+from bisect import bisect_left, bisect_right
+
+from deribit_decode import InstrumentTable
+
+# strikes of one expiry of one currency, sorted once so atm lookups are a bisect
+# calls and puts map strike to instrument name
+class ExpiryStrikes:
+    def __init__(self, base_currency: str, expiration_timestamp: int):
+        self.base_currency = base_currency
+        self.expiration_timestamp = expiration_timestamp
+        self.strikes = []
+        self.calls = {}
+        self.puts = {}
+
+    def add(self, instrument_name: str, strike: float, is_call: bool):
+        if is_call:
+            self.calls[strike] = instrument_name
+        else:
+            self.puts[strike] = instrument_name
+
+    def finalize(self):
+        self.strikes = sorted(set(self.calls) | set(self.puts))
+
+    # strike closest to price, the lower strike wins a tie
+    def atm_strike(self, price: float):
+        i = bisect_left(self.strikes, price)
+        if i == 0:
+            return self.strikes[0]
+        if i == len(self.strikes):
+            return self.strikes[-1]
+        lower = self.strikes[i - 1]
+        upper = self.strikes[i]
+        return lower if price - lower <= upper - price else upper
+
+    # the n strikes closest to price, nearest first
+    def nearest_strikes(self, price: float, n: int):
+        i = bisect_left(self.strikes, price)
+        lo = i - 1
+        hi = i
+        nearest = []
+        while len(nearest) < n and (lo >= 0 or hi < len(self.strikes)):
+            if hi >= len(self.strikes) or (lo >= 0 and price - self.strikes[lo] <= self.strikes[hi] - price):
+                nearest.append(self.strikes[lo])
+                lo -= 1
+            else:
+                nearest.append(self.strikes[hi])
+                hi += 1
+        return nearest
+
+    # the call at strike, or the put when no call is listed, in the shape get_instruments lists it
+    def instrument(self, strike: float):
+        is_call = strike in self.calls
+        return {
+            'instrument_name': self.calls[strike] if is_call else self.puts[strike],
+            'strike': strike,
+            'option_type': 'call' if is_call else 'put',
+            'expiration_timestamp': self.expiration_timestamp,
+            'base_currency': self.base_currency
+        }
+
+# per currency, per expiry strike index built from an InstrumentTable
+class StrikeIndex:
+    def __init__(self, table: InstrumentTable):
+        self.chains = {}
+        self.expiries = {}
+        for instrument_name, base_currency, expiration_timestamp, strike, is_call in table.rows():
+            key = (base_currency, expiration_timestamp)
+            chain = self.chains.get(key)
+            if chain is None:
+                chain = self.chains[key] = ExpiryStrikes(base_currency, expiration_timestamp)
+            chain.add(instrument_name, strike, is_call)
+        for (base_currency, expiration_timestamp), chain in self.chains.items():
+            chain.finalize()
+            self.expiries.setdefault(base_currency, []).append(expiration_timestamp)
+        for expiries in self.expiries.values():
+            expiries.sort()
+
+    def chain(self, base_currency: str, expiration_timestamp: int):
+        return self.chains.get((base_currency, expiration_timestamp))
+
+    # chains of base_currency expiring in [start_timestamp, end_timestamp)
+    def chains_between(self, base_currency: str, start_timestamp: int, end_timestamp: int):
+        expiries = self.expiries.get(base_currency, [])
+        lo = bisect_left(expiries, start_timestamp)
+        hi = bisect_left(expiries, end_timestamp)
+        return [self.chains[(base_currency, expiry)] for expiry in expiries[lo:hi]]
+
+    # first expiry of base_currency strictly after timestamp
+    def next_expiry(self, base_currency: str, timestamp: int):
+        expiries = self.expiries.get(base_currency, [])
+        i = bisect_right(expiries, timestamp)
+        return expiries[i] if i < len(expiries) else None
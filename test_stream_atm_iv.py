@@ -0,0 +1,86 @@
+import asyncio
+import csv
+import json
+import os
+import socket
+import time
+
+import deribit_api
+import stream_atm_iv
+from deribit_ws_replay import ReplayServer
+from get_atm_iv import CURRENCIES, utc_day
+from stand_in_servers import deribit_app, serve_in_thread
+from stream_atm_iv import run_stream
+
+STRIKES = [59000, 60000, 61000, 62000]
+# seconds between recorded messages, time for the streamer to move its subscriptions in between
+GAP = 0.5
+
+def instrument_name(expiry: int, strike: int, option_type: str):
+    day = time.strftime('%d%b%y', time.gmtime(expiry / 1000)).upper()
+    return f"BTC-{day}-{strike}-{option_type[0].upper()}"
+
+# tomorrow's 08:00 UTC chain, the expiry the streamer follows today
+def write_instruments(fixtures: str):
+    expiry = ((utc_day(time.time()) + 1) * 86400 + 8 * 3600) * 1000
+    instruments = [
+        {'instrument_name': instrument_name(expiry, strike, option_type), 'base_currency': 'BTC', 'kind': 'option',
+         'expiration_timestamp': expiry, 'strike': float(strike), 'option_type': option_type}
+        for strike in STRIKES for option_type in ('call', 'put')
+    ]
+    directory = os.path.join(fixtures, 'deribit', 'get_instruments')
+    os.makedirs(directory)
+    with open(os.path.join(directory, 'BTC.json'), mode='w') as file:
+        json.dump({'jsonrpc': '2.0', 'result': instruments}, file)
+    return expiry
+
+def notification(channel: str, data: dict):
+    return {'jsonrpc': '2.0', 'method': 'subscription', 'params': {'channel': channel, 'data': data}}
+
+# the index moves from below to above the 60000 / 61000 midpoint, both atm tickers report before and after
+# the move with their own iv, only the ones of the ticker that is atm at the time may be written
+def write_recording(file_name: str, expiry: int):
+    old = f"ticker.{instrument_name(expiry, 60000, 'call')}.100ms"
+    new = f"ticker.{instrument_name(expiry, 61000, 'call')}.100ms"
+    messages = [
+        [notification('deribit_price_index.btc_usd', {'index_name': 'btc_usd', 'price': 60400.0})],
+        [notification(old, {'mark_iv': 50.0}), notification(new, {'mark_iv': 70.0})],
+        [notification('deribit_price_index.btc_usd', {'index_name': 'btc_usd', 'price': 60600.0})],
+        [notification(old, {'mark_iv': 51.0}), notification(new, {'mark_iv': 71.0})]
+    ]
+    with open(file_name, mode='w') as file:
+        for step, batch in enumerate(messages):
+            for message in batch:
+                file.write(json.dumps({'received': step * GAP, 'message': message}) + '\n')
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def test_stream_follows_atm_ticker_across_strike_midpoint(tmp_path, monkeypatch):
+    fixtures = str(tmp_path / 'fixtures')
+    expiry = write_instruments(fixtures)
+    monkeypatch.setattr(deribit_api, 'base_url', serve_in_thread(deribit_app(fixtures)) + '/api/v2/public')
+    # the replay closes the socket once it is done, the test ends before the streamer would reconnect
+    monkeypatch.setattr(stream_atm_iv, 'RECONNECT_DELAY', 60)
+    monkeypatch.chdir(tmp_path)
+    record_file = str(tmp_path / 'recorded.jsonl')
+    write_recording(record_file, expiry)
+    port = free_port()
+
+    async def scenario():
+        server = asyncio.create_task(ReplayServer(record_file).serve('127.0.0.1', port))
+        await asyncio.sleep(0.1)
+        stream = asyncio.create_task(run_stream(['BTC'], f"ws://127.0.0.1:{port}"))
+        await asyncio.sleep(4 * GAP + 1)
+        for task in (stream, server):
+            task.cancel()
+        await asyncio.gather(stream, server, return_exceptions=True)
+
+    asyncio.run(scenario())
+
+    with open(CURRENCIES['BTC']['csv_file'], newline='') as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ['Timestamp', 'ATM IV']
+    assert [float(value) for _, value in rows[1:]] == [50.0, 71.0]
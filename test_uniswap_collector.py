@@ -0,0 +1,45 @@
+import asyncio
+import csv
+
+from storage import CsvStore
+from uniswap_collector import POOLS, UniswapCollector
+
+SERIES = 'WBTCETH_price_ratio'
+# the first catch-up after head 100 fails once at this block
+FAILING_BLOCK = 102
+
+# a pool whose price moves in every block, block 102 fails on its first read
+class FlakyCollector(UniswapCollector):
+    def __init__(self, store, heads: list):
+        super().__init__(None, {SERIES: POOLS[SERIES]}, store)
+        self.heads = heads
+        self.reads = []
+        self.failed = False
+
+    async def polled_heads(self, interval: float):
+        for head in self.heads:
+            yield head, None
+
+    async def poll(self, block: int = None, strict: bool = False):
+        self.reads.append(block)
+        if block == FAILING_BLOCK and not self.failed:
+            self.failed = True
+            raise ValueError('upstream unavailable')
+        state = {'slot0': (2 ** 96 + block, 0), 'liquidity': 1, 'fee_growth_global0_x128': 0, 'fee_growth_global1_x128': 0}
+        return block, {SERIES: state}
+
+    async def block_timestamp(self, block: int):
+        return 1700000000 + 12 * block
+
+def test_failed_block_is_read_again_with_the_next_head(tmp_path):
+    file_name = str(tmp_path / 'ratio.csv')
+    store = CsvStore({SERIES: {'csv_file': file_name, 'column': 'Price Ratio', 'extra_columns': ['Block']}})
+    collector = FlakyCollector(store, [100, 104, 105])
+    asyncio.run(collector.run_blocks())
+    store.close()
+
+    assert collector.reads == [100, 101, 102, 102, 103, 104, 105]
+    with open(file_name, newline='') as file:
+        rows = list(csv.reader(file))
+    assert rows[0] == ['Timestamp', 'Price Ratio', 'Block']
+    assert [int(row[2]) for row in rows[1:]] == [100, 101, 102, 103, 104, 105]
@@ -0,0 +1,85 @@
+import asyncio
+import os
+
+from web3 import AsyncWeb3
+
+import stand_in_servers
+import uniswap_swaps
+from stand_in_servers import ethereum_app, serve_in_thread
+from uniswap_collector import POOLS
+from uniswap_swaps import SwapIngester, read_swaps
+
+FIRST = 19000000
+LAST = FIRST + 9999
+SWAP_EVERY = 2
+# the first run stops at the range holding this block
+FAILING_BLOCK = FIRST + 6600
+
+# blocks the stand-in makes up a swap in for a pool
+def expected_blocks(address: str):
+    offset = int(address[-4:], 16) % SWAP_EVERY
+    return list(range(FIRST + (offset - FIRST) % SWAP_EVERY, LAST + 1, SWAP_EVERY))
+
+# records the ranges an ingester asks for, if fail is set the ranges holding FAILING_BLOCK fail once they
+# are small enough for the stand-in to answer and some blocks are done, so the run stops half way
+def instrument(ingester: SwapIngester, fail: bool):
+    get_logs = ingester.get_logs
+    calls = []
+
+    async def recorded(first: int, last: int):
+        calls.append((first, last))
+        if fail and first <= FAILING_BLOCK <= last and last - first < 1000 and ingester.done:
+            raise ValueError('upstream unavailable')
+        return await get_logs(first, last)
+
+    ingester.get_logs = recorded
+    return calls
+
+def test_backfill_splits_stops_and_resumes(tmp_path, monkeypatch):
+    # 8000 swaps in 4000 blocks against a 1000 log limit, the first 2000 block ranges are refused
+    monkeypatch.setattr(stand_in_servers, 'MAX_LOGS', 1000)
+    monkeypatch.setattr(uniswap_swaps, 'MAX_RETRIES', 0)
+    monkeypatch.setattr(uniswap_swaps, 'CHECKPOINT_INTERVAL', 0)
+    rpc_url = serve_in_thread(ethereum_app(str(tmp_path), swap_every=SWAP_EVERY))
+    directory = str(tmp_path / 'swaps')
+
+    async def scenario():
+        w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(rpc_url))
+        try:
+            interrupted = SwapIngester(w3, POOLS, directory, concurrency=4)
+            interrupted_calls = instrument(interrupted, fail=True)
+            try:
+                await interrupted.backfill(FIRST, LAST)
+                raise AssertionError('backfill should give up on the failing range')
+            except RuntimeError:
+                pass
+            requests = len(interrupted_calls)
+            await asyncio.sleep(0.2)
+            interrupted.close()
+            assert len(interrupted_calls) == requests, 'workers kept fetching after backfill gave up'
+            assert interrupted.chunk < uniswap_swaps.CHUNK_BLOCKS
+            done = interrupted.done
+            assert done and all(not first <= FAILING_BLOCK <= last for first, last in done)
+
+            resumed = SwapIngester(w3, POOLS, directory, concurrency=4)
+            assert resumed.done == done
+            resumed_calls = instrument(resumed, fail=False)
+            await resumed.backfill(FIRST, LAST)
+            resumed.close()
+            for first, last in resumed_calls:
+                assert all(last < done_first or first > done_last for done_first, done_last in done)
+            assert resumed.done == [[FIRST, LAST]]
+        finally:
+            await w3.provider.disconnect()
+
+    asyncio.run(scenario())
+
+    for series, pool in POOLS.items():
+        rows = read_swaps(os.path.join(directory, f"{series}.csv"))
+        blocks = [int(row[0]) for row in rows]
+        assert blocks == expected_blocks(pool['address'])
+        block, _, _, sender, _, _, _, sqrt_price_x96, liquidity, tick = rows[0]
+        assert sender == pool['address'].lower()
+        assert int(sqrt_price_x96) == 2 ** 96 + int(block)
+        assert int(liquidity) == 10 ** 18 + int(block)
+        assert int(tick) == int(block) % 1000 - 500
@@ -0,0 +1,349 @@
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import time
+
+import websockets
+from eth_abi import decode
+from web3 import AsyncWeb3
+
+from csv_writer import BufferedCsvWriter, install_signal_handlers
+from metrics import inc, set_gauge, set_total, start_http_server, timer
+from multicall import MULTICALL3_ADDRESS, decode_result, encode_calls
+from scheduler import TickStats, fixed_rate
+from storage import ChangeOnlyStore, open_store
+from uniswap_price import pool_price
+
+logging.basicConfig(filename='uniswap.log', level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
+
+# rpc url
+url = 'https://mainnet.infura.io/v3/f86474993783479baa1c55febc6a1274'
+
+# pools the collector polls, series name -> pool
+# the ratio written is the pool price of token1 in token0 scaled by the token decimals,
+# invert writes the price of token0 in token1 instead
+POOLS = {
+    'WBTCETH_price_ratio': {
+        'address': '0xCBCdF9626bC03E24f779434178A73a0B4bad62eD',
+        'csv_file': 'uniswap_data_ratio/WBTCETH_price_ratio.csv',
+        'decimals0': 8,
+        'decimals1': 18,
+        'invert': True
+    },
+    'USDCETH_price_ratio': {
+        'address': '0x88e6A0c2dDD26FEEb64F039a2c41296FcB3f5640',
+        'csv_file': 'uniswap_data_ratio/USDCETH_price_ratio.csv',
+        'decimals0': 6,
+        'decimals1': 18,
+        'invert': True
+    },
+    'WBTCETH_price_ratio_0x45': {
+        'address': '0x4585FE77225b41b697C938B018E2Ac67Ac5a20c0',
+        'csv_file': 'uniswap_data_ratio/WBTCETH_price_ratio_0x45.csv',
+        'decimals0': 8,
+        'decimals1': 18,
+        'invert': True
+    },
+    'ETHUSDT_price_ratio': {
+        'address': '0x4e68Ccd3E89f51C3074ca5072bbAC773960dFa36',
+        'csv_file': 'uniswap_data_ratio/ETHUSDT_price_ratio.csv',
+        'decimals0': 18,
+        'decimals1': 6,
+        'invert': False
+    }
+}
+
+# seconds between polls of every pool, ticks are aligned to the wall clock
+PERIOD = 10
+
+# websocket url of the node for block driven polling, heads come from an eth_subscribe newHeads subscription;
+# None polls eth_blockNumber every BLOCK_POLL_INTERVAL seconds instead
+ws_url = None
+BLOCK_POLL_INTERVAL = 2
+
+# in block driven mode, blocks between two heads are read one by one up to this many, a longer gap is skipped
+MAX_CATCHUP_BLOCKS = 32
+
+# seconds to wait before reconnecting a dropped newHeads subscription
+RECONNECT_DELAY = 1
+
+# pools read per Multicall3 eth_call, longer pool lists are split into batches pinned to one block number
+MULTICALL_BATCH = 100
+
+# multicall requests in flight at once, the rest of a tick's batches wait for a free slot
+MAX_CONCURRENT_CALLS = 8
+
+# raw state of every pool (block, sqrtPriceX96, tick, liquidity, fee growth) goes to <STATE_DIRECTORY>/<series>.csv,
+# None turns it off
+STATE_DIRECTORY = 'uniswap_data_state'
+STATE_HEADER = ['Timestamp', 'Block', 'sqrtPriceX96', 'Tick', 'Liquidity', 'FeeGrowthGlobal0X128', 'FeeGrowthGlobal1X128']
+
+# 'csv' keeps the flat uniswap_data_ratio/*.csv files, 'parquet' writes series/date partitions under PARQUET_ROOT
+STORAGE_BACKEND = 'csv'
+PARQUET_ROOT = 'data'
+
+# port of the local Prometheus /metrics endpoint, None turns it off
+METRICS_PORT = 9109
+
+# slot0 only moves with swaps, so most ticks repeat the previous ratio; with CHANGE_ONLY only changed
+# ratios and a heartbeat row every HEARTBEAT seconds are written, storage.expand_series restores every tick
+CHANGE_ONLY = False
+HEARTBEAT = 600
+
+# views of a Uniswap v3 pool read every tick: state key, selector (the whole calldata, they take no arguments), output types
+POOL_CALLS = [
+    ('slot0', '0x3850c7bd', ['uint160', 'int24', 'uint16', 'uint16', 'uint16', 'uint8', 'bool']),
+    ('liquidity', '0x1a686502', ['uint128']),
+    ('fee_growth_global0_x128', '0xf3058399', ['uint256']),
+    ('fee_growth_global1_x128', '0x46141319', ['uint256'])
+]
+
+# pool list from a json file shaped like POOLS
+def load_pools(file_name: str):
+    with open(file_name) as file:
+        return json.load(file)
+
+# ratio written for a pool from its sqrtPriceX96, rounded once from the exact price
+def price_ratio(pool: dict, sqrt_price_x96: int):
+    return float(pool_price(pool, sqrt_price_x96))
+
+# polls every pool once per tick over one shared provider, the views of all pools are read
+# by Multicall3 eth_calls pinned to one block, so every pool of a tick comes from the same block
+# requests go straight to the provider, the contract call machinery of web3 costs more cpu
+# than the request itself and asks for the chain id on every call
+class UniswapCollector:
+    def __init__(self, w3: AsyncWeb3, pools: dict, store, period: float = PERIOD, state_directory: str = None):
+        self.w3 = w3
+        self.pools = pools
+        self.store = store
+        self.period = period
+        self.addresses = {series: AsyncWeb3.to_checksum_address(pool['address']) for series, pool in pools.items()}
+        self.requests = asyncio.Semaphore(MAX_CONCURRENT_CALLS)
+        self.state_writers = {}
+        if state_directory is not None:
+            os.makedirs(state_directory, exist_ok=True)
+            for series in pools:
+                file_name = os.path.join(state_directory, f"{series}.csv")
+                self.state_writers[series] = BufferedCsvWriter(file_name, STATE_HEADER, max_rows=30, max_delay=60)
+
+    async def request(self, method: str, params: list):
+        async with self.requests:
+            response = await self.w3.provider.make_request(method, params)
+        if response.get('error') or response.get('result') is None:
+            raise ValueError(f"{method} failed: {response.get('error')}")
+        return response['result']
+
+    # one Multicall3 eth_call reading every view of the pools in batch, returns the block number and the raw results
+    async def multicall(self, batch: list, block: str):
+        calls = [(self.addresses[series], selector) for series in batch for _, selector, _ in POOL_CALLS]
+        call = {'to': MULTICALL3_ADDRESS, 'data': encode_calls(calls)}
+        with timer('uniswap_multicall_seconds', pools=len(batch)):
+            result = await self.request('eth_call', [call, block])
+        block_number, _, results = decode_result(result)
+        return block_number, results
+
+    # state of every pool keyed by series at block (number or None for the latest), pools whose read failed
+    # are left out; returns the block number the states were read at and the states
+    # strict raises when a whole multicall failed instead, block driven mode reads that block again
+    async def poll(self, block: int = None, strict: bool = False):
+        series = list(self.pools)
+        batches = [series[i:i + MULTICALL_BATCH] for i in range(0, len(series), MULTICALL_BATCH)]
+        if block is None and len(batches) > 1:
+            block = int(await self.request('eth_blockNumber', []), 16)
+        responses = await asyncio.gather(
+            *(self.multicall(batch, 'latest' if block is None else hex(block)) for batch in batches),
+            return_exceptions=True
+        )
+        if strict:
+            for response in responses:
+                if isinstance(response, BaseException):
+                    raise response
+        states = {}
+        for batch, response in zip(batches, responses):
+            if isinstance(response, BaseException):
+                for name in batch:
+                    inc('collector_errors_total', pool=name)
+                print(f"multicall of {len(batch)} pools failed: {response}")
+                logging.error(f"multicall of {len(batch)} pools failed: {response!r}")
+                continue
+            block, results = response
+            for i, name in enumerate(batch):
+                pool_results = results[i * len(POOL_CALLS):(i + 1) * len(POOL_CALLS)]
+                if not all(success for success, _ in pool_results):
+                    inc('collector_errors_total', pool=name)
+                    logging.error(f"{name} read failed at block {block}")
+                    continue
+                state = {}
+                for (key, _, types), (_, data) in zip(POOL_CALLS, pool_results):
+                    values = decode(types, data)
+                    state[key] = values if key == 'slot0' else values[0]
+                states[name] = state
+        return block, states
+
+    def write_states(self, timestamp: datetime.datetime, block: int, states: dict):
+        for series, state in states.items():
+            writer = self.state_writers.get(series)
+            if writer is not None:
+                sqrt_price_x96, tick = state['slot0'][:2]
+                writer.write_row([timestamp.isoformat(), block, sqrt_price_x96, tick, state['liquidity'],
+                                  state['fee_growth_global0_x128'], state['fee_growth_global1_x128']])
+
+    # series opened with a Block column (see open_pool_store) get the block number on their ratio rows
+    def persist(self, timestamp: datetime.datetime, block: int, states: dict):
+        with timer('collector_stage_seconds', stage='persist', pool='all'):
+            for series, state in states.items():
+                extra = [block] if 'Block' in self.store.series[series].get('extra_columns', []) else []
+                self.store.append(series, timestamp, price_ratio(self.pools[series], state['slot0'][0]), *extra)
+            self.write_states(timestamp, block, states)
+            self.store.flush_if_due()
+            for writer in self.state_writers.values():
+                writer.flush_if_due()
+
+    async def run(self):
+        stats = TickStats('uniswap')
+        async for tick in fixed_rate(self.period, stats):
+            try:
+                block, states = await self.poll()
+            except Exception as e:
+                inc('collector_errors_total', pool='all')
+                print(f"Exception occured: {e}")
+                logging.exception('uniswap tick failed')
+                continue
+            timestamp = datetime.datetime.fromtimestamp(tick)
+            self.persist(timestamp, block, states)
+            print(f"{timestamp.isoformat()} block {block}: {len(states)}/{len(self.pools)} pools polled")
+            logging.info(f"block {block}: {len(states)}/{len(self.pools)} pools polled")
+            set_total('collector_missed_ticks_total', stats.missed, pool='all')
+
+    # (number, timestamp) of every new head from an eth_subscribe newHeads subscription, resubscribing when the socket drops
+    async def subscribed_heads(self, url: str):
+        while True:
+            try:
+                async with websockets.connect(url) as websocket:
+                    await websocket.send(json.dumps({'jsonrpc': '2.0', 'id': 1, 'method': 'eth_subscribe', 'params': ['newHeads']}))
+                    async for raw in websocket:
+                        message = json.loads(raw)
+                        if message.get('method') == 'eth_subscription':
+                            head = message['params']['result']
+                            yield int(head['number'], 16), int(head['timestamp'], 16)
+                        elif message.get('error'):
+                            raise ValueError(f"eth_subscribe failed: {message['error']}")
+            except (OSError, websockets.ConnectionClosed) as e:
+                print(f"newHeads subscription dropped: {e}")
+                logging.warning(f"newHeads subscription dropped: {e}")
+            await asyncio.sleep(RECONNECT_DELAY)
+
+    # (number, None) of every new head seen by polling eth_blockNumber
+    async def polled_heads(self, interval: float):
+        last = None
+        while True:
+            started = time.monotonic()
+            try:
+                number = int(await self.request('eth_blockNumber', []), 16)
+                if number != last:
+                    last = number
+                    yield number, None
+            except Exception as e:
+                inc('collector_errors_total', pool='all')
+                print(f"eth_blockNumber failed: {e}")
+                logging.error(f"eth_blockNumber failed: {e!r}")
+            await asyncio.sleep(max(0.0, interval - (time.monotonic() - started)))
+
+    async def block_timestamp(self, block: int):
+        header = await self.request('eth_getBlockByNumber', [hex(block), False])
+        return int(header['timestamp'], 16)
+
+    # block driven mode: reads every pool once per new block instead of once per period, blocks missed
+    # between two heads are read too, so every state change is sampled exactly once; a block that fails
+    # stops the catch-up there and is read again with the next head
+    # rows are timestamped with the block timestamp, carry the block number and are written only for pools
+    # whose state changed in that block
+    async def run_blocks(self, url: str = None, interval: float = BLOCK_POLL_INTERVAL):
+        heads = self.subscribed_heads(url) if url else self.polled_heads(interval)
+        last_block = None
+        last_states = {}
+        async for head, head_timestamp in heads:
+            set_gauge('uniswap_head_block', head)
+            first = head if last_block is None or head <= last_block else last_block + 1
+            if head - first >= MAX_CATCHUP_BLOCKS:
+                skipped = head - first - MAX_CATCHUP_BLOCKS + 1
+                inc('uniswap_skipped_blocks_total', skipped)
+                logging.warning(f"{skipped} block(s) from {first} skipped, {head - first + 1} behind the head")
+                first += skipped
+            for block in range(first, head + 1):
+                try:
+                    _, states = await self.poll(block, strict=True)
+                    timestamp = head_timestamp if block == head and head_timestamp is not None else await self.block_timestamp(block)
+                except Exception as e:
+                    # later blocks wait for this one, the next head reads again from last_block + 1
+                    inc('collector_errors_total', pool='all')
+                    print(f"Exception occured at block {block}: {e}")
+                    logging.exception(f"uniswap block {block} failed")
+                    break
+                # a head at or below the last block is a reorg, the replaced block is read again
+                changed = {series: state for series, state in states.items() if last_states.get(series) != state}
+                last_states.update(changed)
+                last_block = block
+                inc('uniswap_blocks_total')
+                self.persist(datetime.datetime.fromtimestamp(timestamp), block, changed)
+                print(f"block {block}: {len(changed)}/{len(self.pools)} pools changed")
+                logging.info(f"block {block}: {len(changed)}/{len(self.pools)} pools changed")
+
+    def close(self):
+        for writer in self.state_writers.values():
+            writer.close()
+
+# block driven rows are already written on change only and carry the block they were read at in a Block column
+# directory moves the parquet root somewhere else, the csv files keep the paths of the pool list
+def open_pool_store(pools: dict, period: float = PERIOD, blocks: bool = False, backend: str = STORAGE_BACKEND, directory: str = None):
+    series = {name: {'csv_file': pool['csv_file'], 'column': 'Price Ratio'} for name, pool in pools.items()}
+    if blocks:
+        for config in series.values():
+            config['extra_columns'] = ['Block']
+    if backend == 'parquet':
+        store = open_store('parquet', series, root=directory or PARQUET_ROOT)
+    else:
+        store = open_store(backend, series, max_rows=30, max_delay=60)
+    if CHANGE_ONLY and not blocks:
+        store = ChangeOnlyStore(store, {name: period for name in pools}, HEARTBEAT)
+    return store
+
+# blocks switches to block driven polling, over the newHeads subscription of block_url when given
+async def run(pools: dict, rpc_url: str, period: float = PERIOD, blocks: bool = False, block_url: str = ws_url,
+              backend: str = STORAGE_BACKEND, directory: str = None):
+    w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(rpc_url))
+    store = open_pool_store(pools, period, blocks, backend, directory)
+    collector = UniswapCollector(w3, pools, store, period, STATE_DIRECTORY)
+    try:
+        if blocks:
+            await collector.run_blocks(block_url)
+        else:
+            await collector.run()
+    finally:
+        collector.close()
+        store.close()
+        await w3.provider.disconnect()
+
+# usage: python uniswap_collector.py [--pools pools.json] [--rpc-url URL] [--period 10] [--blocks [--ws-url WSS_URL]]
+#                                    [--backend parquet [--parquet-root data]]
+def main():
+    parser = argparse.ArgumentParser(description='Collect Uniswap v3 pool price ratios')
+    parser.add_argument('--pools', default=None, help='json file of pools shaped like POOLS, default the built-in list')
+    parser.add_argument('--rpc-url', default=url)
+    parser.add_argument('--period', type=float, default=PERIOD)
+    parser.add_argument('--blocks', action='store_true', help='read the pools once per new block instead of once per period')
+    parser.add_argument('--ws-url', default=ws_url, help='websocket url for a newHeads subscription, default polls eth_blockNumber')
+    parser.add_argument('--backend', choices=['csv', 'parquet'], default=STORAGE_BACKEND)
+    parser.add_argument('--parquet-root', default=PARQUET_ROOT)
+    args = parser.parse_args()
+    pools = load_pools(args.pools) if args.pools else POOLS
+    install_signal_handlers()
+    if METRICS_PORT is not None:
+        start_http_server(METRICS_PORT)
+    asyncio.run(run(pools, args.rpc_url, args.period, args.blocks, args.ws_url, args.backend, args.parquet_root))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+import math
+from fractions import Fraction
+
+import numpy as np
+
+# Uniswap v3 prices are token1 per token0 in raw units, as a Q64.96 square root in slot0 and swaps
+# or as a tick, price = 1.0001 ** tick
+# a pool dict (see uniswap_collector.POOLS) has decimals0, decimals1 and invert: the decimals turn raw units
+# into whole tokens and invert gives the price of token0 in token1 instead
+Q96 = 2 ** 96
+Q192 = 2 ** 192
+
+MIN_TICK = -887272
+MAX_TICK = 887272
+MIN_SQRT_RATIO = 4295128739
+MAX_SQRT_RATIO = 1461446703485210103287273052203988822378723970342
+
+# log(1.0001), the vectorized tick path works in log space
+LOG_TICK_BASE = math.log1p(1e-4)
+
+# TickMath.getSqrtRatioAtTick: 1 / sqrt(1.0001) ** (2 ** i) as Q128.128 for every bit i of the tick
+TICK_BIT_RATIOS = (
+    0xfffcb933bd6fad37aa2d162d1a594001, 0xfff97272373d413259a46990580e213a, 0xfff2e50f5f656932ef12357cf3c7fdcc,
+    0xffe5caca7e10e4e61c3624eaa0941cd0, 0xffcb9843d60f6159c9db58835c926644, 0xff973b41fa98c081472e6896dfb254c0,
+    0xff2ea16466c96a3843ec78b326b52861, 0xfe5dee046a99a2a811c461f1969c3053, 0xfcbe86c7900a88aedcffc83b479aa3a4,
+    0xf987a7253ac413176f2b074cf7815e54, 0xf3392b0822b70005940c7a398e4b70f3, 0xe7159475a2c29b7443b29c7fa6e889d9,
+    0xd097f3bdfd2022b8845ad8f792aa5825, 0xa9f746462d870fdf8a65dc1f90e061e5, 0x70d869a156d2a1b890bb3df62baf32f7,
+    0x31be135f97d08fd981231505542fcfa6, 0x9aa508b5b7a84e1c677de54f3e99bc9, 0x5d6af8dedb81196699c329225ee604,
+    0x2216e584f5fa1ea926041bedfe98, 0x48a170391f7dc42444e8fa2
+)
+
+# exact price of a sqrtPriceX96 as a fraction, in whole tokens and oriented by invert
+def sqrt_price_to_price(sqrt_price_x96: int, decimals0: int, decimals1: int, invert: bool = False):
+    if sqrt_price_x96 <= 0:
+        raise ValueError(f"sqrtPriceX96 must be positive, got {sqrt_price_x96}")
+    numerator = sqrt_price_x96 * sqrt_price_x96 * 10 ** decimals0
+    denominator = Q192 * 10 ** decimals1
+    return Fraction(denominator, numerator) if invert else Fraction(numerator, denominator)
+
+# sqrtPriceX96 at the lower boundary of a tick, bit for bit what the pool contracts compute
+def sqrt_price_at_tick(tick: int):
+    if not MIN_TICK <= tick <= MAX_TICK:
+        raise ValueError(f"tick {tick} outside [{MIN_TICK}, {MAX_TICK}]")
+    abs_tick = abs(tick)
+    ratio = TICK_BIT_RATIOS[0] if abs_tick & 1 else 1 << 128
+    for bit, bit_ratio in enumerate(TICK_BIT_RATIOS[1:], start=1):
+        if abs_tick & (1 << bit):
+            ratio = (ratio * bit_ratio) >> 128
+    if tick > 0:
+        ratio = (2 ** 256 - 1) // ratio
+    # Q128.128 to Q64.96, rounded up so the tick of the result is tick itself
+    return (ratio >> 32) + (1 if ratio & 0xffffffff else 0)
+
+# exact price of a tick's lower boundary as a fraction, through the same sqrtPriceX96 the pool uses for it
+def tick_to_price(tick: int, decimals0: int, decimals1: int, invert: bool = False):
+    return sqrt_price_to_price(sqrt_price_at_tick(tick), decimals0, decimals1, invert)
+
+def pool_price(pool: dict, sqrt_price_x96: int):
+    return sqrt_price_to_price(sqrt_price_x96, pool['decimals0'], pool['decimals1'], pool['invert'])
+
+# float64 prices of many sqrtPriceX96 values (python ints, decimal strings or a numpy array) at once,
+# within a few ulp of the exact price: the uint160 is rounded to a double once, the 2 ** 96 scaling is exact
+# and the decimals are one more rounding
+def sqrt_prices_to_prices(sqrt_prices_x96, decimals0: int, decimals1: int, invert: bool = False):
+    sqrt_prices = np.asarray(sqrt_prices_x96, dtype=np.float64)
+    if invert:
+        ratio = Q96 / sqrt_prices
+        return ratio * ratio * 10.0 ** (decimals1 - decimals0)
+    ratio = sqrt_prices * (1.0 / Q96)
+    return ratio * ratio * 10.0 ** (decimals0 - decimals1)
+
+# float64 prices 1.0001 ** tick of many ticks at once, exp(tick * log(1.0001)) keeps the relative error
+# near 1e-14 over the whole tick range where 1.0001 ** tick would accumulate the rounding of 1.0001
+# this is the price of the tick itself, tick_to_price is the pool's Q64.96 rounding of it,
+# which is up to ~5e-10 away at the extreme ticks
+def ticks_to_prices(ticks, decimals0: int, decimals1: int, invert: bool = False):
+    exponents = np.asarray(ticks, dtype=np.float64) * LOG_TICK_BASE
+    if invert:
+        return np.exp(-exponents) * 10.0 ** (decimals1 - decimals0)
+    return np.exp(exponents) * 10.0 ** (decimals0 - decimals1)
+
+def pool_prices(pool: dict, sqrt_prices_x96):
+    return sqrt_prices_to_prices(sqrt_prices_x96, pool['decimals0'], pool['decimals1'], pool['invert'])
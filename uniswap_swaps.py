@@ -0,0 +1,309 @@
+import argparse
+import asyncio
+import csv
+import json
+import logging
+import os
+import time
+
+from web3 import AsyncWeb3
+
+from csv_writer import BufferedCsvWriter, install_signal_handlers
+from metrics import inc, set_gauge, start_http_server, timer
+from rate_limiter import backoff_delay
+from uniswap_collector import POOLS, load_pools, url
+
+logging.basicConfig(filename='uniswap.log', level=logging.INFO, format='%(asctime)s:%(levelname)s:%(message)s')
+
+# Swap(address indexed sender, address indexed recipient, int256 amount0, int256 amount1,
+#      uint160 sqrtPriceX96, uint128 liquidity, int24 tick) of a Uniswap v3 pool
+SWAP_TOPIC = '0xc42079f94a6350d7e6235f29174924f928cc2ac818eb64fed8004e115fbcca67'
+
+# swaps of every pool go to <SWAP_DIRECTORY>/<series>.csv, the backfill progress to <SWAP_DIRECTORY>/checkpoint.json
+# logs carry no block time on most nodes, rows are keyed by block and join block timestamps from elsewhere
+SWAP_DIRECTORY = 'uniswap_data_swaps'
+SWAP_HEADER = ['Block', 'LogIndex', 'Transaction', 'Sender', 'Recipient', 'Amount0', 'Amount1', 'sqrtPriceX96', 'Liquidity', 'Tick']
+
+# blocks of the first eth_getLogs range, the range then adapts: it is halved when the node refuses it
+# (too many results, range too wide, timeout) and doubled while responses stay under TARGET_LOGS logs
+CHUNK_BLOCKS = 2000
+MIN_CHUNK_BLOCKS = 1
+MAX_CHUNK_BLOCKS = 100000
+TARGET_LOGS = 5000
+
+# eth_getLogs ranges in flight at once
+MAX_CONCURRENT_RANGES = 8
+
+# transient failures (connection errors, rate limits) of one range are retried this many times
+MAX_RETRIES = 5
+BACKOFF_BASE = 0.2
+BACKOFF_CAP = 5.0
+
+# seconds between checkpoint writes, rows are flushed to disk before every checkpoint
+CHECKPOINT_INTERVAL = 5
+
+# blocks behind the head that are considered final, the follow mode never reads past them
+CONFIRMATIONS = 12
+FOLLOW_INTERVAL = 12
+
+# error messages of nodes refusing a range because of its size rather than failing, matched in lower case
+RANGE_ERRORS = ('more than', 'too many', 'range', 'limit exceeded', 'response size', 'timeout', 'timed out')
+
+# two's complement of a 32 byte word
+def signed(word: int):
+    return word - (1 << 256) if word >= 1 << 255 else word
+
+# one Swap log as a csv row, the data is five static words so they are sliced instead of abi decoded
+def decode_swap(log: dict):
+    data = bytes.fromhex(log['data'][2:])
+    words = [int.from_bytes(data[i:i + 32], 'big') for i in range(0, 160, 32)]
+    return [
+        int(log['blockNumber'], 16),
+        int(log['logIndex'], 16),
+        log['transactionHash'],
+        '0x' + log['topics'][1][-40:],
+        '0x' + log['topics'][2][-40:],
+        signed(words[0]),
+        signed(words[1]),
+        words[2],
+        words[3],
+        signed(words[4])
+    ]
+
+# sorted, merged list of [first, last] block ranges
+def merge_ranges(ranges: list):
+    merged = []
+    for first, last in sorted(ranges):
+        if merged and first <= merged[-1][1] + 1:
+            merged[-1][1] = max(merged[-1][1], last)
+        else:
+            merged.append([first, last])
+    return merged
+
+# parts of [first, last] not covered by the merged ranges done
+def missing_ranges(first: int, last: int, done: list):
+    missing = []
+    for done_first, done_last in done:
+        if done_last < first or done_first > last:
+            continue
+        if done_first > first:
+            missing.append([first, done_first - 1])
+        first = done_last + 1
+    if first <= last:
+        missing.append([first, last])
+    return missing
+
+# ingests the Swap events of the pools from eth_getLogs into one csv per pool
+# the block ranges already ingested are kept in a checkpoint file, so a backfill stopped at any point
+# resumes where it left off; a range whose rows were written but not yet checkpointed is fetched again,
+# readers drop the duplicate rows by (Block, LogIndex)
+class SwapIngester:
+    def __init__(self, w3: AsyncWeb3, pools: dict, directory: str = SWAP_DIRECTORY, concurrency: int = MAX_CONCURRENT_RANGES):
+        self.w3 = w3
+        self.pools = pools
+        self.directory = directory
+        self.concurrency = concurrency
+        self.series = {pool['address'].lower(): series for series, pool in pools.items()}
+        self.addresses = [AsyncWeb3.to_checksum_address(pool['address']) for pool in pools.values()]
+        self.chunk = CHUNK_BLOCKS
+        self.checkpoint_file = os.path.join(directory, 'checkpoint.json')
+        os.makedirs(directory, exist_ok=True)
+        self.done = self.load_checkpoint()
+        self.writers = {}
+        for series in pools:
+            file_name = os.path.join(directory, f"{series}.csv")
+            header = None if os.path.exists(file_name) else SWAP_HEADER
+            self.writers[series] = BufferedCsvWriter(file_name, header, max_rows=1000, max_delay=CHECKPOINT_INTERVAL)
+        self.checkpointed = time.monotonic()
+        self.swaps = 0
+        self.requests = 0
+        self.in_flight = set()
+
+    # ranges are only comparable for the same pool list
+    def load_checkpoint(self):
+        if not os.path.exists(self.checkpoint_file):
+            return []
+        with open(self.checkpoint_file) as file:
+            checkpoint = json.load(file)
+        if sorted(checkpoint['pools']) != sorted(self.series):
+            raise ValueError(f"{self.checkpoint_file} was written for other pools, use another directory")
+        return merge_ranges(checkpoint['done'])
+
+    def save_checkpoint(self):
+        for writer in self.writers.values():
+            writer.flush()
+        temporary = self.checkpoint_file + '.tmp'
+        with open(temporary, mode='w') as file:
+            json.dump({'pools': sorted(self.series), 'done': self.done}, file)
+        os.replace(temporary, self.checkpoint_file)
+        self.checkpointed = time.monotonic()
+
+    # web3 takes its session lock on an executor thread and a request cancelled while it waits for it leaves
+    # the lock held for good, so a cancelled worker only stops waiting and the request runs out on its own
+    async def get_logs(self, first: int, last: int):
+        params = [{'address': self.addresses, 'topics': [SWAP_TOPIC], 'fromBlock': hex(first), 'toBlock': hex(last)}]
+        self.requests += 1
+        request = asyncio.ensure_future(self.w3.provider.make_request('eth_getLogs', params))
+        self.in_flight.add(request)
+        request.add_done_callback(self.in_flight.discard)
+        with timer('uniswap_get_logs_seconds'):
+            response = await asyncio.shield(request)
+        if response.get('error'):
+            raise ValueError(response['error'].get('message', str(response['error'])))
+        return response['result']
+
+    # logs of one range, or None when the node refused its size and the range was split in halves back onto pending
+    async def fetch(self, first: int, last: int, pending: list):
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                logs = await self.get_logs(first, last)
+            except asyncio.TimeoutError as e:
+                error = e
+                message = 'timeout'
+            except Exception as e:
+                error = e
+                message = str(e).lower()
+            else:
+                if len(logs) < TARGET_LOGS // 2:
+                    self.chunk = min(MAX_CHUNK_BLOCKS, max(self.chunk, (last - first + 1) * 2))
+                return logs
+            if last > first and any(text in message for text in RANGE_ERRORS):
+                self.chunk = max(MIN_CHUNK_BLOCKS, min(self.chunk, (last - first + 1) // 2))
+                middle = (first + last) // 2
+                pending.append([middle + 1, last])
+                pending.append([first, middle])
+                inc('uniswap_split_ranges_total')
+                logging.info(f"blocks {first}-{last} refused ({error}), split, chunk now {self.chunk} blocks")
+                return None
+            inc('collector_errors_total', pool='swaps')
+            logging.warning(f"eth_getLogs {first}-{last} failed ({error!r}), attempt {attempt + 1}")
+            if attempt < MAX_RETRIES:
+                await asyncio.sleep(backoff_delay(attempt, BACKOFF_BASE, BACKOFF_CAP))
+        raise RuntimeError(f"eth_getLogs {first}-{last} gave up after {MAX_RETRIES + 1} attempts")
+
+    def write(self, first: int, last: int, logs: list):
+        for log in logs:
+            series = self.series.get(log['address'].lower())
+            if series is None or log.get('removed') or log['topics'][0] != SWAP_TOPIC:
+                continue
+            self.writers[series].write_row(decode_swap(log))
+            self.swaps += 1
+        self.done = merge_ranges(self.done + [[first, last]])
+        if time.monotonic() - self.checkpointed >= CHECKPOINT_INTERVAL:
+            self.save_checkpoint()
+
+    # ingest every swap of blocks first to last that is not in the checkpoint yet
+    # workers take the next range of the current chunk size off the front of the missing blocks,
+    # a split range goes back on the front so the checkpoint keeps advancing
+    async def backfill(self, first: int, last: int):
+        pending = missing_ranges(first, last, self.done)[::-1]
+        in_flight = 0
+
+        def next_range():
+            if not pending:
+                return None
+            range_first, range_last = pending.pop()
+            if range_last - range_first + 1 > self.chunk:
+                pending.append([range_first + self.chunk, range_last])
+                range_last = range_first + self.chunk - 1
+            return range_first, range_last
+
+        async def worker():
+            nonlocal in_flight
+            while True:
+                block_range = next_range()
+                if block_range is None:
+                    if in_flight == 0:
+                        return
+                    # another worker may still split its range
+                    await asyncio.sleep(0.01)
+                    continue
+                in_flight += 1
+                try:
+                    logs = await self.fetch(*block_range, pending)
+                    if logs is not None:
+                        self.write(*block_range, logs)
+                        set_gauge('uniswap_swaps_block', self.done[0][1] if self.done else 0)
+                finally:
+                    in_flight -= 1
+
+        # a worker that gives up stops the others before the checkpoint is written, none of them
+        # may keep fetching into the next follow pass or into closed writers
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        try:
+            await asyncio.gather(*workers)
+        finally:
+            for task in workers:
+                task.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+            await asyncio.gather(*self.in_flight, return_exceptions=True)
+            self.save_checkpoint()
+
+    async def head(self):
+        response = await self.w3.provider.make_request('eth_blockNumber', [])
+        return int(response['result'], 16)
+
+    # backfill from first and then keep up with the chain, CONFIRMATIONS blocks behind the head
+    async def follow(self, first: int):
+        while True:
+            try:
+                last = await self.head() - CONFIRMATIONS
+                if last >= first:
+                    await self.backfill(first, last)
+            except Exception as e:
+                inc('collector_errors_total', pool='swaps')
+                print(f"Exception occured: {e}")
+                logging.exception('swap ingestion failed')
+            await asyncio.sleep(FOLLOW_INTERVAL)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+# swap rows of one pool csv in chain order, without the duplicates a resumed backfill can leave
+def read_swaps(file_name: str):
+    rows = {}
+    with open(file_name, newline='') as file:
+        reader = csv.reader(file)
+        next(reader, None)
+        for row in reader:
+            rows[(int(row[0]), int(row[1]))] = row
+    return [rows[key] for key in sorted(rows)]
+
+async def run(pools: dict, rpc_url: str, first: int, last: int = None, directory: str = SWAP_DIRECTORY,
+              concurrency: int = MAX_CONCURRENT_RANGES):
+    w3 = AsyncWeb3(AsyncWeb3.AsyncHTTPProvider(rpc_url, request_kwargs={'timeout': 30}))
+    ingester = SwapIngester(w3, pools, directory, concurrency)
+    started = time.perf_counter()
+    try:
+        if last is None:
+            await ingester.follow(first)
+        else:
+            await ingester.backfill(first, last)
+    finally:
+        ingester.close()
+        await w3.provider.disconnect()
+        elapsed = time.perf_counter() - started
+        print(f"{ingester.swaps} swaps in {ingester.requests} eth_getLogs requests, {elapsed:.1f}s")
+        logging.info(f"{ingester.swaps} swaps in {ingester.requests} eth_getLogs requests, {elapsed:.1f}s")
+
+# usage: python uniswap_swaps.py --from-block 12370000 [--to-block 12500000] [--pools pools.json] [--rpc-url URL]
+# without --to-block the ingester backfills to the head and then follows it
+def main():
+    parser = argparse.ArgumentParser(description='Ingest Uniswap v3 Swap events from eth_getLogs')
+    parser.add_argument('--from-block', type=int, required=True)
+    parser.add_argument('--to-block', type=int, default=None)
+    parser.add_argument('--pools', default=None, help='json file of pools shaped like uniswap_collector.POOLS')
+    parser.add_argument('--rpc-url', default=url)
+    parser.add_argument('--output', default=SWAP_DIRECTORY)
+    parser.add_argument('--concurrency', type=int, default=MAX_CONCURRENT_RANGES)
+    parser.add_argument('--metrics-port', type=int, default=None)
+    args = parser.parse_args()
+    pools = load_pools(args.pools) if args.pools else POOLS
+    install_signal_handlers()
+    if args.metrics_port is not None:
+        start_http_server(args.metrics_port)
+    asyncio.run(run(pools, args.rpc_url, args.from_block, args.to_block, args.output, args.concurrency))
+
+if __name__ == "__main__":
+    main()